@@ -1,22 +1,20 @@
-import datetime
 import logging
 import sys
 from argparse import ArgumentParser
 
 from . import __version__
-from .config import (Config, configfile_default_location, file_editor,
-                     find_configfile, load_config_legacy_format)
-from .entry_evaluation import evaluate_entries, sort_entries
-from .output import print_entries
-from .parse import get_entries, submission_window_start
-from .categories import check_categories
+from .config import (Config, cachedir_default_location, configfile_default_location,
+                     file_editor, find_configfile, load_config_legacy_format)
+
+# modules for fetching, rating and printing entries are imported in the
+# functions using them, so --version, --edit etc. start up quickly
 
 
 logger = logging.getLogger(__name__)
 
 
-def parse_cli_arguments() -> tuple:
-    """Definition and parsing of command line arguments"""
+def parse_cli_arguments(argv: list = None) -> tuple:
+    """Definition and parsing of command line arguments (default: `sys.argv[1:]`)"""
     parser = ArgumentParser()
     parser.add_argument("--config", metavar="/path/to/config",
                         help="Path to configuration file (check README for defaults)")
@@ -42,12 +40,272 @@ def parse_cli_arguments() -> tuple:
                         help="Ignore cross-lists")
     parser.add_argument("--ignore-abstract", action="store_true", default=None,
                         help="Ignore abstract in rating")
+    parser.add_argument("--progressive", action="store_true",
+                        help="print matching entries as soon as they are found, then the ranked list")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of processes used for rating entries")
+    parser.add_argument("--no-store", dest="store", action="store_false",
+                        help="Don't use the local record store, fetch everything from the server")
+    parser.add_argument("--cache-responses", action="store_true",
+                        help="Store raw server responses for replay with --offline (implies --no-store)")
+    parser.add_argument("--offline", "--replay", dest="offline", action="store_true",
+                        help="Replay server responses stored with --cache-responses (implies --no-store)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print time, memory and throughput of each stage to stderr")
+    parser.add_argument("--stats-json", metavar="/path/to/stats.json",
+                        help="Write time, memory and throughput of each stage as JSON")
+    parser.add_argument("--cprofile", metavar="/path/to/profile",
+                        help="Write cProfile statistics of the run (view with `python -m pstats`)")
+    parser.add_argument("--server", metavar="URL",
+                        help="Get rated entries from an `arxiv-scan serve` server instead of harvesting them")
     parser.add_argument("--log", choices=["info", "debug"], default="warning",
                         help="Set loglevel")
     parser.add_argument("--version", action="version",
                         version="%(prog)s {}".format(__version__))
 
-    return parser.parse_args()
+    subparsers = parser.add_subparsers(dest="command", metavar="{serve,batch,search}")
+    serve = subparsers.add_parser(
+        "serve", help="Keep harvested entries in memory and rate them for clients using --server",
+        description="Harvest the categories (-c or config) since --date (default: recent), "
+                    "refresh them after every arXiv announcement and rate them for clients "
+                    "(`arxiv-scan --server URL`). Options go before `serve`.",
+    )
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="Address to listen on (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=None,
+                       help="Port to listen on (default: 8470)")
+    batch = subparsers.add_parser(
+        "batch", help="Rate one harvest for every config file in a directory",
+        description="Harvest the categories of all config files (*.conf) in a directory once, "
+                    "rate the entries for each config and write the ranked entries to <name>.json.",
+    )
+    batch.add_argument("profiles", metavar="/path/to/configs",
+                       help="Directory with one config file per profile")
+    batch.add_argument("-o", "--output", metavar="/path/to/results", default=None,
+                       help="Directory for the results (default: the config directory)")
+    search = subparsers.add_parser(
+        "search", help="Search the records in the local record store",
+        description='Search title and abstract of all harvested records. Combine words and "phrases" '
+                    "with AND (default), OR, NOT (or -word) and parentheses, search authors with "
+                    "author:name and categories with cat:category.",
+    )
+    search.add_argument("query", nargs="+", help="Search query")
+    search.add_argument("-n", "--number", type=int, default=20,
+                        help="Maximum number of results (default: 20)")
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    return parser.parse_args(_negated_search_terms(argv, parser, search))
+
+
+def _options_with_value(parser) -> set:
+    return {
+        option for action in parser._actions if action.nargs not in (0, "?")
+        for option in action.option_strings
+    }
+
+def _negated_search_terms(argv: list, parser, search_parser) -> list:
+    """Replace `-word` in search queries by `NOT word`, as argparse takes it for an unknown option
+
+    The options of the search command are moved before the query, so its
+    words can be given on both sides of them.
+    """
+    with_value = _options_with_value(parser)
+    i = 0
+    while i < len(argv):
+        if argv[i] in with_value:
+            i += 2
+        elif argv[i].startswith("-"):
+            i += 1
+        else:
+            break
+    if i >= len(argv) or argv[i] != "search":
+        return argv
+
+    options = set(search_parser._option_string_actions)
+    with_value = _options_with_value(search_parser)
+    search_options = []
+    query = []
+    arguments = iter(argv[i + 1:])
+    for argument in arguments:
+        if argument in with_value:
+            search_options += [argument, next(arguments, "")]
+        elif argument in options or argument.split("=", 1)[0] in options:
+            search_options.append(argument)
+        elif argument == "--":
+            continue
+        elif argument.startswith("-") and len(argument) > 1:
+            query += ["NOT", argument[1:]]
+        else:
+            query.append(argument)
+    return argv[:i + 1] + search_options + query
+
+
+def read_config(args) -> Config:
+    """Read config file and overwrite options given as command line arguments"""
+    # read config
+    config = Config()
+    if args.config:
+        configfile = args.config
+    else:
+        try:
+            configfile = find_configfile()
+        except FileNotFoundError:
+            logger.error("Cannot find config file. Check Readme for configuration locations")
+            sys.exit(1)
+
+    config.read(configfile)
+    logger.info("Reading configuration from file '%s'", configfile)
+
+    # overwrite config from CLI arguments
+    config["date"] = args.date
+    config["length"] = args.length
+    config["minimum_rating"] = args.rating
+    config["categories"] = args.categories
+    config["reverse_list"] = args.reverse
+    config["resubmissions"] = args.resubmissions
+    config["show_cross_lists"] = (
+        not args.ignore_cross_lists if args.ignore_cross_lists is not None else None
+    )
+    config["ignore_abstract"] = args.ignore_abstract
+    config["jobs"] = args.jobs
+
+    return config
+
+
+def serve(args):
+    """Run `arxiv-scan serve` until interrupted"""
+    from .categories import check_categories
+    from .oai_api import OAIClient
+    from .parse import parse_date
+    from .server import EntryPool, ScanServer, default_port
+    from .store import RecordStore
+
+    config = read_config(args)
+    categories = [cat.strip() for cat in config["categories"].split(",")]
+    catalogue_path = cachedir_default_location(mkdir=True) / "categories.json"
+    client = OAIClient()
+    try:
+        check_categories(categories, catalogue_path, client)
+    except ValueError:
+        print()
+        print("One or more categories not found. Use --edit to adjust categories")
+        sys.exit(1)
+
+    store = None
+    if args.store:
+        store = RecordStore(cachedir_default_location(mkdir=True) / "records.sqlite")
+    pool = EntryPool(categories, window=args.date or "recent", store=store, client=client,
+                     catalogue_path=catalogue_path)
+    server = ScanServer((args.host, args.port or default_port), pool)
+    host, port = server.server_address[:2]
+    try:
+        print(f"Harvesting {', '.join(categories)} since {parse_date(pool.window)}")
+        pool.refresh()
+        print(f"Serving {pool.status()['entries']} entries on http://{host}:{port}")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if store is not None:
+            store.close()
+
+
+def rate_batch(args):
+    """Run `arxiv-scan batch`"""
+    from .batch import load_profiles, profile_categories, run_batch, write_results
+    from .categories import check_categories
+    from .oai_api import OAIClient
+    from .store import RecordStore
+
+    profiles = load_profiles(args.profiles)
+    if not profiles:
+        print(f"No config files (*.conf) found in {args.profiles}")
+        sys.exit(1)
+    print(f"Rating submissions for {len(profiles)} profiles: {', '.join(profiles)}")
+
+    # check if categories of all profiles exist
+    client = OAIClient()
+    try:
+        check_categories(profile_categories(profiles),
+                         cachedir_default_location(mkdir=True) / "categories.json", client)
+    except ValueError:
+        print()
+        print("One or more categories not found. Check the categories of the config files")
+        sys.exit(1)
+    except Exception as e:
+        print("Error while fetching categories:")
+        print(repr(e))
+        sys.exit(1)
+
+    store = None
+    if args.store:
+        store = RecordStore(cachedir_default_location(mkdir=True) / "records.sqlite")
+    try:
+        results = run_batch(profiles, store=store, client=client)
+    except Exception as e:
+        print("Error while fetching feed:")
+        print(repr(e))
+        sys.exit(1)
+    finally:
+        if store is not None:
+            store.close()
+
+    output = args.output or args.profiles
+    write_results(results, output)
+    for name, entries in results.items():
+        print(f"{name}: {len(entries)} entries")
+    print(f"Written results to {output}")
+
+
+def search(args):
+    """Run `arxiv-scan search`"""
+    from .output import print_entries
+    from .search import SearchIndex, highlight
+    from .store import RecordStore
+
+    query = " ".join(args.query)
+    cachedir = cachedir_default_location()
+    if not (cachedir / "records.sqlite").is_file():
+        print("No harvested records found. Run arxiv-scan (without --no-store) first")
+        sys.exit(1)
+
+    with RecordStore(cachedir / "records.sqlite") as store, SearchIndex(cachedir / "search.sqlite") as index:
+        n = index.update(store)
+        logger.info("Indexed %d new or updated records", n)
+        try:
+            results = index.search(query, limit=args.number)
+        except ValueError as e:
+            print(f"Invalid query: {e}")
+            sys.exit(1)
+        entries = store.entries_by_id([id for id, _ in results])
+
+    ranked = []
+    for id, score in results:
+        entry = entries[id]
+        entry.rating = score
+        highlight(entry, query)
+        ranked.append(entry)
+    print_entries(ranked)
+
+
+def print_from_server(args):
+    """Print entries rated by an `arxiv-scan serve` server"""
+    from .output import print_entries
+    from .server import query_server
+
+    config = read_config(args)
+    print(f"Getting rated submissions from {args.server}")
+    try:
+        entries = query_server(args.server, config)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    except Exception as e:
+        print("Error while querying server:")
+        print(repr(e))
+        sys.exit(1)
+    print_entries(entries)
 
 
 def main():
@@ -55,6 +313,19 @@ def main():
 
     logging.basicConfig(level=getattr(logging, args.log.upper()))
 
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(run, args)
+        finally:
+            profiler.dump_stats(args.cprofile)
+    else:
+        run(args)
+
+
+def run(args):
+    """Run arxiv-scan with parsed command line arguments"""
     # write default config
     if args.default_config:
         if args.default_config is True:
@@ -91,60 +362,51 @@ def main():
         file_editor(path)
         sys.exit()
 
-    # read config
-    config = Config()
-    if args.config:
-        configfile = args.config
-    else:
-        try:
-            configfile = find_configfile()
-        except FileNotFoundError:
-            logger.error("Cannot find config file. Check Readme for configuration locations")
-            sys.exit(1)
-
-    config.read(configfile)
-    logger.info("Reading configuration from file '%s'", configfile)
+    if args.command == "serve":
+        serve(args)
+        return
+    if args.command == "batch":
+        rate_batch(args)
+        return
+    if args.command == "search":
+        search(args)
+        return
+    if args.server:
+        print_from_server(args)
+        return
 
-    # overwrite config from CLI arguments
-    config["date"] = args.date
-    config["length"] = args.length
-    config["minimum_rating"] = args.rating
-    config["categories"] = args.categories
-    config["reverse_list"] = args.reverse
-    config["resubmissions"] = args.resubmissions
-    config["show_cross_lists"] = (
-        not args.ignore_cross_lists if args.ignore_cross_lists is not None else None
-    )
-    config["ignore_abstract"] = args.ignore_abstract
+    from .categories import check_categories
+    from .entry_evaluation import EntryRanker, evaluate_entries, iter_evaluated
+    from .oai_api import OAIClient, ResponseCache
+    from .output import print_entries
+    from .parse import iter_entries, parse_date
+    from .rating import load_profile
+    from .stats import RunStats
+    from .store import RecordStore
 
-    # parse date string
-    if config["date"] == "new" or config["date"] is None:
-        cutoff_date = submission_window_start(datetime.datetime.now().astimezone())
-    elif config["date"] == "recent":
-        cutoff_date = submission_window_start(
-            datetime.datetime.now().astimezone() - datetime.timedelta(days=6)
-        )
-    elif isinstance(config["date"], int):
-        cutoff_date = (
-            datetime.datetime.now().astimezone().replace(hour=0, minute=0,second=0, microsecond=0)
-            - datetime.timedelta(days=config["date"])
-        )
-    else:
-        try:
-            cutoff_date = datetime.datetime.strptime(config["date"], "%Y-%m").astimezone()
-        except ValueError:
-            try:
-                cutoff_date = datetime.datetime.strptime(config["date"], "%Y-%m-%d").astimezone()
-            except ValueError:
-                raise ValueError("Couldn't parse parameter 'date' from argument or config file") from None
+    stats = RunStats(enabled=args.profile or args.stats_json is not None)
+    with stats.stage("config"):
+        config = read_config(args)
+        cutoff_date = parse_date(config["date"])
+        # keywords and authors compiled once per config file version
+        profile = load_profile(config, cachedir_default_location() / "profiles")
 
     print(f"Getting Submissions since {cutoff_date}")
 
+    # client for the OAI API, optionally recording or replaying responses
+    cache = None
+    if args.cache_responses or args.offline:
+        cache = ResponseCache(cachedir_default_location(mkdir=True) / "responses")
+        # responses are cached for the full date range, not for the delta of the record store
+        args.store = False
+    client = OAIClient(cache=cache, offline=args.offline)
+
     # check if categories exist
     categories = config["categories"].split(",")
     categories = [cat.strip() for cat in categories]
     try:
-        check_categories(categories)
+        with stats.stage("categories"):
+            check_categories(categories, cachedir_default_location(mkdir=True) / "categories.json", client)
     except ValueError:
         print()
         print("One or more categories not found. Use --edit to adjust categories")
@@ -154,29 +416,66 @@ def main():
         print(repr(e))
         sys.exit(1)
 
-    # get entries from server and parse them
+    # get entries from server (and local record store), rate and rank them
+    # while they arrive
+    ranker = EntryRanker(
+        rating_min=config["minimum_rating"],
+        reverse=config["reverse_list"],
+        length=config["length"],
+    )
+    store = None
+    if args.store:
+        store = RecordStore(cachedir_default_location(mkdir=True) / "records.sqlite")
     try:
-        entries = get_entries(
+        entries = iter_entries(
             categories, cutoff_date=cutoff_date,
             cross_lists=config["show_cross_lists"],
-            resubmissions=config["resubmissions"]
+            resubmissions=config["resubmissions"],
+            store=store,
+            client=client,
+            counters=stats.counters,
         )
+        entries = stats.timed(entries, "harvest")
+        if config["jobs"] > 1:
+            # rating in parallel needs all entries at once
+            entries = list(entries)
+            with stats.stage("evaluate"):
+                evaluate_entries(entries, profile=profile, workers=config["jobs"])
+        else:
+            entries = iter_evaluated(entries, profile=profile)
+            entries = stats.timed(entries, "evaluate")
+        for entry in entries:
+            stats.counters.add("entries")
+            with stats.stage("rank"):
+                qualified = ranker.add(entry)
+            if qualified and args.progressive:
+                with stats.stage("print"):
+                    print_entries([entry])
     except Exception as e:
         print("Error while fetching feed:")
         print(repr(e))
         sys.exit(1)
+    finally:
+        if store is not None:
+            store.close()
 
-    # rate, sort, and print entries
-    evaluate_entries(entries, keyword_ratings=config.keywords,
-                     author_ratings=config.authors, rate_abstract=not config["ignore_abstract"])
-    entries = sort_entries(
-        entries,
-        rating_min=config["minimum_rating"],
-        reverse=config["reverse_list"],
-        length=config["length"],
-    )
-    print_entries(entries)
+    # print ranked entries
+    with stats.stage("rank"):
+        results = ranker.results()
+    with stats.stage("print"):
+        if args.progressive:
+            print()
+            print("Ranked results:")
+        print_entries(results)
 
+    stats.counters.add("http_requests", client.requests)
+    stats.counters.add("http_bytes", client.bytes_transferred)
+    if args.profile:
+        print(file=sys.stderr)
+        print(stats.summary(), file=sys.stderr)
+    if args.stats_json is not None:
+        with open(args.stats_json, "w") as f:
+            f.write(stats.to_json())
 
 if __name__ == "__main__":
     main()
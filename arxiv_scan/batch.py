@@ -0,0 +1,211 @@
+"""Rate one harvest for many configurations (profiles) at once"""
+import json
+import logging
+from pathlib import Path
+
+from .config import Config
+from .entry_evaluation import Entry, EntryRanker, entry_to_dict
+from .matching import AuthorMatcher, KeywordMatcher
+from .oai_api import OAIClient
+from .parse import get_entries, keep_category, keep_dates, parse_date
+from .store import RecordStore
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_profiles(directory: Path) -> dict:
+    """Read all config files (`*.conf`) in directory
+
+    Returns:
+        dict: profile name (file name without suffix) to Config
+    """
+    profiles = {}
+    for path in sorted(Path(directory).glob("*.conf")):
+        config = Config()
+        config.read(path)
+        profiles[path.stem] = config
+    return profiles
+
+
+class ProfileMatcher:
+    """Merged keyword and author index of several profiles
+
+    All keywords and authors of all profiles are compiled into a single
+    `KeywordMatcher` and `AuthorMatcher`, and every term maps to the
+    profiles rating it. An entry is scanned once, however many profiles
+    there are, and the ratings of all profiles follow from the matched
+    terms. The results are the same as evaluating the entry with every
+    profile on its own (see `Entry.evaluate`).
+
+    Args:
+        profiles (list): `(keyword_ratings, author_ratings, rate_abstract)` per profile
+    """
+
+    def __init__(self, profiles: list):
+        self.rate_abstract = [rate_abstract for _, _, rate_abstract in profiles]
+        # term to [(profile, rating, position of term in profile config)]
+        keywords = {}
+        authors = {}
+        for p, (keyword_ratings, author_ratings, _) in enumerate(profiles):
+            # compile per profile for the same normalization as on its own
+            keyword_matcher = KeywordMatcher(keyword_ratings)
+            for order, (keyword, rating) in enumerate(zip(keyword_matcher.keywords, keyword_matcher.ratings)):
+                keywords.setdefault(keyword, []).append((p, rating, order))
+            author_matcher = AuthorMatcher(author_ratings)
+            for order, (author, rating) in enumerate(zip(author_matcher.authors, author_matcher.ratings)):
+                authors.setdefault(author, []).append((p, rating, order))
+
+        self.keyword_matcher = KeywordMatcher(dict.fromkeys(keywords, 0))
+        self.keyword_profiles = [keywords[keyword] for keyword in self.keyword_matcher.keywords]
+        self.author_matcher = AuthorMatcher(dict.fromkeys(authors, 0))
+        self.author_profiles = [authors[author] for author in self.author_matcher.authors]
+
+    def __len__(self) -> int:
+        return len(self.rate_abstract)
+
+    def evaluate(self, entry: Entry, profiles, rating_min: list = None) -> dict:
+        """Evaluate entry for the given profile indices
+
+        Args:
+            entry (Entry): entry to evaluate, it is not changed
+            profiles: indices of the profiles to evaluate the entry for
+            rating_min (:obj:`list`, optional): minimum rating per profile,
+                copies are only made for profiles the entry qualifies for
+
+        Returns:
+            dict: profile index to evaluated copy of entry (see `Entry.copy`)
+        """
+        profiles = set(profiles)
+        title_matches = self.keyword_matcher.scan(entry.title)
+        rate_abstract = any(self.rate_abstract[p] for p in profiles)
+        abstract_matches = self.keyword_matcher.scan(entry.abstract) if rate_abstract else {}
+        author_matches = self.author_matcher.match(entry.authors)
+
+        # profile to ([(order, keyword, value)], [(order, author, value)], spans, author positions)
+        found = {p: ([], [], [], []) for p in profiles}
+        for i in title_matches.keys() | abstract_matches.keys():
+            spans = title_matches.get(i, ())
+            in_abstract = len(abstract_matches.get(i, ()))
+            for p, rating, order in self.keyword_profiles[i]:
+                if p not in found:
+                    continue
+                counts = len(spans) + (in_abstract if self.rate_abstract[p] else 0)
+                if counts:
+                    found[p][0].append((order, self.keyword_matcher.keywords[i], counts * rating))
+                    found[p][2].extend(spans)
+        for i, position in author_matches.items():
+            for p, rating, order in self.author_profiles[i]:
+                if p in found:
+                    found[p][1].append((order, self.author_matcher.authors[i], rating))
+                    found[p][3].append(position)
+
+        evaluated = {}
+        for p, (keywords, authors, spans, positions) in found.items():
+            rating = sum(value for _, _, value in keywords) + sum(value for _, _, value in authors)
+            if rating_min is not None and rating < rating_min[p]:
+                continue
+            copy = entry.copy()
+            # same order of detailed ratings as `Entry.evaluate`: keywords, then authors, in config order
+            for _, term, value in sorted(keywords) + sorted(authors):
+                copy.detailed_ratings[term] = value
+            for start, end in spans:
+                copy.mark_title_span(start, end)
+            for position in positions:
+                copy.mark_author(position)
+            copy.rating = rating
+            evaluated[p] = copy
+        return evaluated
+
+
+def rate_profiles(entries, profiles: dict) -> dict:
+    """Filter, rate and rank entries for every profile
+
+    Every entry is checked against the categories, date, cross-list and
+    resubmission options of each profile, and scanned once for all
+    profiles it passes.
+
+    Args:
+        entries (list): entries of all categories of the profiles since the earliest
+                 date, including cross-lists and resubmissions (from `parse.get_entries`,
+                 complete, as `matched_categories` is only known at the end of the harvest)
+        profiles (dict): profile name to Config
+
+    Returns:
+        dict: profile name to ranked list of entries
+    """
+    names = list(profiles)
+    configs = [profiles[name] for name in names]
+    matcher = ProfileMatcher([
+        (config.keywords, config.authors, not config["ignore_abstract"]) for config in configs
+    ])
+    filters = [
+        (
+            set(category.strip() for category in config["categories"].split(",")),
+            parse_date(config["date"]),
+            config["show_cross_lists"],
+            config["resubmissions"],
+        )
+        for config in configs
+    ]
+    rankers = [
+        EntryRanker(config["minimum_rating"], config["reverse_list"], config["length"])
+        for config in configs
+    ]
+    rating_min = [ranker.rating_min for ranker in rankers]
+
+    for entry in entries:
+        dates = (entry.date_submitted, entry.date_updated)
+        interested = [
+            p for p, (categories, cutoff_date, cross_lists, resubmissions) in enumerate(filters)
+            if keep_dates(dates, cutoff_date, resubmissions)
+            and any(keep_category(entry.category, category, cross_lists)
+                    for category in entry.matched_categories if category in categories)
+        ]
+        if not interested:
+            continue
+        for p, evaluated in matcher.evaluate(entry, interested, rating_min).items():
+            rankers[p].add(evaluated)
+
+    return {name: ranker.results() for name, ranker in zip(names, rankers)}
+
+
+def profile_categories(profiles: dict) -> list:
+    """Categories of all profiles (profile name to Config), without duplicates"""
+    categories = []
+    for config in profiles.values():
+        for category in config["categories"].split(","):
+            if category.strip() not in categories:
+                categories.append(category.strip())
+    return categories
+
+
+def run_batch(profiles: dict, store: RecordStore = None, client: OAIClient = None,
+              workers: int = 4) -> dict:
+    """Harvest the categories of all profiles once and rate the entries for each of them
+
+    Args:
+        profiles (dict): profile name to Config
+        store (:obj:`RecordStore`, optional): Local record store for incremental harvesting
+        client (:obj:`OAIClient`, optional): Client for the OAI API
+        workers (:obj:`int`, optional): Number of categories harvested at the same time
+
+    Returns:
+        dict: profile name to ranked list of entries
+    """
+    categories = profile_categories(profiles)
+    cutoff_date = min(parse_date(config["date"]) for config in profiles.values())
+    logger.info(f"Harvesting {', '.join(categories):s} since {cutoff_date} for {len(profiles):d} profiles")
+
+    entries = get_entries(categories, cutoff_date=cutoff_date, cross_lists=True, resubmissions=True,
+                          store=store, workers=workers, client=client)
+    return rate_profiles(entries, profiles)
+
+
+def write_results(results: dict, directory: Path):
+    """Write ranked entries of every profile to `<directory>/<profile>.json`"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, entries in results.items():
+        with open(directory / f"{name:s}.json", "w") as f:
+            json.dump([entry_to_dict(entry) for entry in entries], f, indent=1)
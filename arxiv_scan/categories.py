@@ -1,55 +1,133 @@
-import urllib
-import urllib.request
+import http.client
+import json
+import logging
+import os
+import threading
 import time
 
+from pathlib import Path
 from xml.etree import ElementTree
 
-from .oai_api import namespaces, base_url, attempts
+from .oai_api import OAIClient, attempts, default_client, namespaces, timeout
 
 
-def check_categories(categories):
+logger = logging.getLogger(__name__)
+
+
+# time after which the cached category catalogue is revalidated with the server
+catalogue_ttl = 7 * 24 * 3600
+
+# timeout for revalidation requests, the cached catalogue is used if the server is slower
+revalidation_timeout = 10
+
+
+def _download_catalogue(client: OAIClient, headers: dict = None, attempts: int = attempts):
+    """Download ListSets response, returns None if not modified (304)"""
+    response = client.get(
+        "verb=ListSets", headers=headers,
+        timeout=revalidation_timeout if headers is not None else timeout,
+        attempts=attempts,
+    )
+    if response.status == 304:
+        return None
+
+    # parse XML data
+    root = ElementTree.fromstring(response.data)
+    xml_categories = root.findall("./oai:ListSets/oai:set", namespaces=namespaces)
+
+    # retrieve categories from XML data
+    return {
+        "categories": sorted(cat.find("./oai:setSpec", namespaces=namespaces).text for cat in xml_categories),
+        "last_modified": response.headers.get("Last-Modified"),
+        "etag": response.headers.get("ETag"),
+    }
+
+
+def load_categories(cache_path: Path = None, ttl: float = None, client: OAIClient = None) -> list:
+    """Get sorted list of all arXiv categories
+
+    If `cache_path` is given, the catalogue is cached there. Within `ttl`
+    seconds (default: `catalogue_ttl`) the cached catalogue is used without
+    a server request, afterwards it is revalidated with a conditional
+    request. If the server does not answer in time or asks to retry later,
+    the cached catalogue is used regardless of its age.
+
+    Args:
+        cache_path (Path): location of cached catalogue (JSON)
+        ttl (float): time in seconds a cached catalogue is used without revalidation
+        client (OAIClient): client for the OAI API (default: `oai_api.default_client()`)
+    """
+    if ttl is None:
+        ttl = catalogue_ttl
+    if client is None:
+        client = default_client()
+
+    cached = None
+    if cache_path is not None:
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    if cached is None:
+        catalogue = _download_catalogue(client)
+    elif time.time() - cached["fetched"] < ttl:
+        return cached["categories"]
+    else:
+        headers = {}
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        try:
+            # don't wait for retries, there is a cached copy to fall back to
+            catalogue = _download_catalogue(client, headers, attempts=1)
+        except (OSError, http.client.HTTPException) as err:
+            logger.warning("Could not revalidate category catalogue, using cached copy (%r)", err)
+            return cached["categories"]
+        if catalogue is None:
+            catalogue = cached
+
+    if cache_path is not None:
+        catalogue["fetched"] = time.time()
+        # write to temporary file first, so interrupted or concurrent runs never leave a partial file
+        cache_path = Path(cache_path)
+        temporary = cache_path.with_suffix(".tmp{:d}-{:d}".format(os.getpid(), threading.get_ident()))
+        with open(temporary, "w") as f:
+            json.dump(catalogue, f)
+        os.replace(temporary, cache_path)
+
+    return catalogue["categories"]
+
+
+def check_categories(categories, cache_path: Path = None, client: OAIClient = None):
     """Check if given arXiv categories exist
 
     If one of the categories does not exist, we print all available categories
     and raise ValueError.
 
     Note that we obtain the recent arXiv categories with a (rather fast) server
-    request via the OAI API.
+    request via the OAI API, which is cached at `cache_path` (if given), see
+    `load_categories`.
 
     Args:
         categories (list): List of arXiv subjects (e.g. `physics:astro-ph:EP`)
+        cache_path (Path): location of cached category catalogue
+        client (OAIClient): client for the OAI API (default: `oai_api.default_client()`)
     """
-    url = f"{base_url:s}?verb=ListSets"
-
-    # get data from server
-    for i in range(attempts):
-        try:
-            xml_data = urllib.request.urlopen(url)
-        except urllib.error.HTTPError as err:
-            if err.code == 503:
-                timeout = int(err.headers['Retry-After'])
-                time.sleep(timeout)
-            else:
-                raise err
-        else:
-            with xml_data:
-                tree = ElementTree.parse(xml_data)
-            break
+    categories_all = load_categories(cache_path, client=client)
+    categories_set = set(categories_all)
 
-    # parse XML data
-    root = tree.getroot()
-    xml_categories = root.findall("./oai:ListSets/oai:set", namespaces=namespaces)
-
-    # retrieve categories from XML data
-    categories_all = []
-    for cat in xml_categories:
-        categories_all.append(cat.find("./oai:setSpec", namespaces=namespaces).text)
-    categories_all.sort()
+    if cache_path is not None and not categories_set.issuperset(categories):
+        # categories might be new since the catalogue was cached
+        categories_all = load_categories(cache_path, ttl=0, client=client)
+        categories_set = set(categories_all)
 
     # check if categories are found
     not_found = []
     for cat in categories:
-        if cat not in categories_all:
+        if cat not in categories_set:
             not_found.append(cat)
 
     # print available categories in case one or more were not found
@@ -14,11 +14,16 @@ class Config:
 
     Internally stores the configuration in a configparser.Configparser object,
     but adds method for accessing keywords and authors with the right types, as
-    configparser only uses `str`
+    configparser only uses `str`. Converted values are cached until the
+    config is changed.
     """
 
     def __init__(self):
         self._config = ConfigParser()
+        # converted keywords, authors and options, cleared on every change
+        self._cache = {}
+        # file the config was read from, None if changed since (see `rating.load_profile`)
+        self.path = None
 
         self._config["keywords"] = {}
         self._config["authors"] = {}
@@ -31,33 +36,48 @@ class Config:
             "resubmissions": False,
             "show_cross_lists": True,
             "ignore_abstract": False,
+            "jobs": 1,
         }
 
     @property
     def keywords(self) -> dict:
         """Get keywords/rating as dict with type `dict[str,int]`"""
-        return {
-            keyword: int(rating) for keyword, rating in self._config["keywords"].items()
-        }
+        if "keywords" not in self._cache:
+            self._cache["keywords"] = {
+                keyword: int(rating) for keyword, rating in self._config["keywords"].items()
+            }
+        return dict(self._cache["keywords"])
 
     def add_keyword(self, keyword: str, rating: int):
         """Add keyword with rating to config"""
         self._config["keywords"][keyword] = str(rating)
+        self._changed()
 
     @property
     def authors(self):
         """Get authors/rating as dict with type `dict[str,int]`"""
-        return {
-            author: int(rating) for author, rating in self._config["authors"].items()
-        }
+        if "authors" not in self._cache:
+            self._cache["authors"] = {
+                author: int(rating) for author, rating in self._config["authors"].items()
+            }
+        return dict(self._cache["authors"])
 
     def add_author(self, author: str, rating: int):
         """Add author with rating to config"""
         self._config["authors"][author] = str(rating)
+        self._changed()
+
+    def _changed(self):
+        self._cache.clear()
+        self.path = None
 
     def read(self, path: Path):
         """Read path to config. Existing values will be overwritten"""
-        self._config.read(path)
+        # keywords and authors only come from this file if there were none before
+        only_file = not self._config["keywords"] and not self._config["authors"]
+        self._changed()
+        if self._config.read(path) and only_file:
+            self.path = Path(path)
 
     def write(self, path: Path, overwrite: bool = False):
         """Write config to file. Will not overwrite existing files if `overwrite` is false"""
@@ -66,16 +86,25 @@ class Config:
 
     def __getitem__(self, key: str):
         """Get option value from config"""
-        # use literal_eval to convert if its not a str
-        try:
-            return literal_eval(self._config["options"][key])
-        except (ValueError, SyntaxError):
-            return self._config["options"][key]
+        options = self._cache.setdefault("options", {})
+        if key not in options:
+            # use literal_eval to convert if its not a str
+            try:
+                options[key] = literal_eval(self._config["options"][key])
+            except (ValueError, SyntaxError):
+                options[key] = self._config["options"][key]
+        return options[key]
 
     def __setitem__(self, key, value):
         """Set option if value is not None"""
         if value is not None:
             self._config["options"][key] = str(value)
+            self._cache.pop("options", None)
+
+    @property
+    def options(self) -> dict:
+        """Get all options with converted types (see `__getitem__`)"""
+        return {key: self[key] for key in self._config["options"]}
 
 
 def find_configfile(name: str="arxiv-scan") -> Path:
@@ -131,6 +160,28 @@ def configfile_default_location(mkdir: bool=False, name: str="arxiv-scan") -> Pa
     return path
 
 
+def cachedir_default_location(mkdir: bool=False, name: str="arxiv-scan") -> Path:
+    """Find platform dependent cache directory
+
+    With `mkdir=True` the directory (and all its parents) is created.
+
+    On Linux: `$XDG_CACHE_HOME/arxiv-scan` (`~/.cache/arxiv-scan`)
+    On Windows: `$LOCALAPPDATA/arxiv-scan/Cache`
+    On MacOS: `$HOME/Library/Caches/arxiv-scan`
+    """
+    if sys.platform == "darwin": # MacOS
+        path = Path.home() / "Library" / "Caches" / name
+    elif sys.platform == "win32": # Windows
+        path = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / name / "Cache"
+    else: # Linux and other Unixes
+        path = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / name
+
+    if mkdir:
+        path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
 def file_editor(path: Path):
     """Open file in default text editor
 
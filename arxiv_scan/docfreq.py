@@ -0,0 +1,167 @@
+"""Document frequencies of words in harvested abstracts
+
+For every category (set spec of the record store) the table counts in how
+many records (title and abstract) each word occurs, with the words found
+by `wordcounter.words`. The wordcounter uses it to rank suggested keywords
+by TF-IDF against the configured categories (see `tfidf`): words common in
+the field rate entries poorly, words specific to the user's texts well.
+
+The table is kept in a SQLite file next to the record store. Words are
+stored once and referenced by number, and the words of every record are
+kept as a packed array, so a record written again (e.g. a new version) is
+subtracted before it is counted again. `update` only reads the records
+written to the store since the last update.
+"""
+import math
+from array import array
+from collections import Counter
+
+from .entry_evaluation import Entry
+from .store import StoreIndex
+from .wordcounter import words
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS terms (
+    term INTEGER PRIMARY KEY,
+    word TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS frequencies (
+    set_spec TEXT NOT NULL,
+    term INTEGER NOT NULL,
+    df INTEGER NOT NULL,
+    PRIMARY KEY (set_spec, term)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS totals (
+    set_spec TEXT PRIMARY KEY,
+    documents INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    set_specs TEXT NOT NULL,
+    terms BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class DocumentFrequencies(StoreIndex):
+    """Persistent document frequencies of words per category
+
+    Kept up to date with `update` (see `store.StoreIndex`).
+
+    Args:
+        path (Path): location of the SQLite database file
+    """
+
+    schema = _schema
+
+    def document(self, entry: Entry, set_specs: list) -> tuple:
+        """`(id, text, set_specs)` of a stored record, as passed to `add`"""
+        return entry.id, f"{entry.title} {entry.abstract}", set_specs
+
+    def add(self, documents: list, watermark: int = None):
+        """Count `(id, text, set_specs)` documents, replacing earlier versions of them"""
+        with self._lock, self._db:
+            documents = [(id, set(words(text)), set_specs) for id, text, set_specs in documents]
+            vocabulary = self._terms(set().union(*(unique for _, unique, _ in documents)))
+            # changes of document frequencies (set_spec to Counter of terms) and totals
+            frequencies = {}
+            totals = Counter()
+            for id, unique, set_specs in documents:
+                row = self._db.execute("SELECT set_specs, terms FROM documents WHERE id = ?", (id,)).fetchone()
+                if row is not None:
+                    old_terms = array("I", row[1])
+                    for set_spec in row[0].split(","):
+                        totals[set_spec] -= 1
+                        frequencies.setdefault(set_spec, Counter()).subtract(old_terms)
+
+                for word in [word for word in unique if word not in vocabulary]:
+                    vocabulary[word] = self._db.execute("INSERT INTO terms (word) VALUES (?)", (word,)).lastrowid
+                terms = array("I", map(vocabulary.__getitem__, unique))
+                for set_spec in set_specs:
+                    totals[set_spec] += 1
+                    frequencies.setdefault(set_spec, Counter()).update(terms)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+                    (id, ",".join(sorted(set_specs)), terms.tobytes()),
+                )
+
+            self._db.executemany(
+                "INSERT INTO frequencies VALUES (?, ?, ?) "
+                "ON CONFLICT (set_spec, term) DO UPDATE SET df = df + excluded.df",
+                [(set_spec, term, df) for set_spec, counts in frequencies.items()
+                 for term, df in counts.items() if df],
+            )
+            # words no longer in any record of a category
+            self._db.executemany(
+                "DELETE FROM frequencies WHERE set_spec = ? AND term = ? AND df <= 0",
+                [(set_spec, term) for set_spec, counts in frequencies.items()
+                 for term, df in counts.items() if df < 0],
+            )
+            self._db.executemany(
+                "INSERT INTO totals VALUES (?, ?) "
+                "ON CONFLICT (set_spec) DO UPDATE SET documents = documents + excluded.documents",
+                [(set_spec, n) for set_spec, n in totals.items() if n],
+            )
+            self._set_watermark(watermark)
+
+    def _terms(self, batch_words: set) -> dict:
+        """Numbers of the stored words among `batch_words`"""
+        batch_words = list(batch_words)
+        terms = {}
+        # stay below SQLite's limit of variables per statement
+        for i in range(0, len(batch_words), 500):
+            chunk = batch_words[i:i + 500]
+            terms.update(self._db.execute(
+                f"SELECT word, term FROM terms WHERE word IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        return terms
+
+    def documents(self, set_specs: list) -> int:
+        """Number of records counted in the given categories"""
+        set_specs = list(set_specs)
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT SUM(documents) FROM totals WHERE set_spec IN ({', '.join('?' * len(set_specs))})",
+                set_specs,
+            ).fetchone()
+        return row[0] or 0
+
+    def frequencies(self, set_specs: list) -> dict:
+        """Document frequency of every word in the given categories
+
+        Records in several of the categories are counted once per category,
+        in `documents` as well.
+
+        Returns:
+            dict: word to number of records containing it
+        """
+        set_specs = list(set_specs)
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT t.word, SUM(f.df) FROM frequencies f JOIN terms t ON t.term = f.term "
+                f"WHERE f.set_spec IN ({', '.join('?' * len(set_specs))}) GROUP BY f.term",
+                set_specs,
+            ))
+
+
+def tfidf(counts: Counter, frequencies: dict, documents: int) -> dict:
+    """TF-IDF score of counted words against document frequencies
+
+    The score is the number of occurrences times `log(documents / df)`.
+    Words found in nearly every record score close to zero, and words never
+    found (which can't rate any entry of the categories) score zero.
+
+    Args:
+        counts (Counter): occurrences of words (see `wordcounter.count_words`)
+        frequencies (dict): document frequency of words (see `DocumentFrequencies.frequencies`)
+        documents (int): number of records the frequencies are counted from
+
+    Returns:
+        dict: word to score
+    """
+    scores = {}
+    for word, count in counts.items():
+        df = frequencies.get(word, 0)
+        scores[word] = count * math.log(documents / df) if df else 0.0
+    return scores
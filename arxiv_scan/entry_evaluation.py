@@ -1,10 +1,26 @@
 """Definition of class Entry and all evaluation related functions"""
-import re
-from datetime import datetime
+import heapq
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+from .matching import AuthorMatcher, KeywordMatcher
+from .rating import RatingProfile
 
 
 class Entry(object):
-    """This class represents one arxiv entry"""
+    """This class represents one arxiv entry
+
+    Entries use `__slots__` and interned strings for category and author
+    names (which repeat a lot across entries) to keep large harvests small.
+    """
+
+    __slots__ = (
+        "id", "title", "authors", "abstract", "category", "matched_categories",
+        "date_submitted", "date_updated", "title_spans", "author_marks",
+        "rating", "detailed_ratings",
+    )
 
     def __init__(self, id: str, title: str,
                  authors: list, abstract: str, category: str = "",
@@ -13,14 +29,18 @@ class Entry(object):
                  number: int = None):
         self.id = id
         self.title = title
-        self.authors = authors
+        self.authors = [sys.intern(author) for author in authors]
         self.abstract = abstract
-        self.category = category
+        self.category = sys.intern(category)
+        # requested categories this entry was found in (includes cross-lists)
+        self.matched_categories = []
         self.date_submitted = date_submitted
         self.date_updated = date_updated
 
-        self.title_marks = []
-        self.author_marks = [False] * len(self.authors)
+        # merged, sorted (start, end) spans of marked title characters
+        self.title_spans = []
+        # one byte per author, nonzero if marked
+        self.author_marks = bytearray(len(self.authors))
 
         self.rating = None
         self.detailed_ratings = {}
@@ -34,26 +54,54 @@ class Entry(object):
             "\n)"
         )
 
+    def copy(self) -> "Entry":
+        """Copy of entry without evaluation, sharing all strings with the original"""
+        copy = Entry.__new__(Entry)
+        for name in ("id", "title", "authors", "abstract", "category", "matched_categories",
+                     "date_submitted", "date_updated"):
+            setattr(copy, name, getattr(self, name))
+        copy.title_spans = []
+        copy.author_marks = bytearray(len(self.authors))
+        copy.rating = None
+        copy.detailed_ratings = {}
+        return copy
+
+    def mark_title_span(self, start: int, end: int) -> None:
+        """Mark title from start to end position, merging overlapping marks"""
+        spans = self.title_spans
+        i = bisect_left(spans, (start, end))
+        # merge with preceding span if they overlap or touch
+        if i > 0 and spans[i - 1][1] >= start:
+            i -= 1
+            start = spans[i][0]
+            end = max(end, spans[i][1])
+        # merge with following spans
+        j = i
+        while j < len(spans) and spans[j][0] <= end:
+            end = max(end, spans[j][1])
+            j += 1
+        spans[i:j] = [(start, end)]
+
     def mark_title_position(self, position: int) -> None:
         """Mark title at given position"""
-        self.title_marks.append(position)
+        self.mark_title_span(position, position + 1)
 
     def mark_title_keyword(self, keyword: str) -> None:
         """Mark title at positions where keyword is found"""
-        counts = self.title.lower().count(keyword)
-        for _ in range(counts):
-            starts = [m.start() for m in re.finditer(keyword, self.title.lower())]
-            ends = [m.end() for m in re.finditer(keyword, self.title.lower())]
-            for s, e in zip(starts, ends):
-                for pos in range(s, e):
-                    self.mark_title_position(pos)
+        title = self.title.lower()
+        start = title.find(keyword)
+        while keyword and start >= 0:
+            self.mark_title_span(start, start + len(keyword))
+            start = title.find(keyword, start + len(keyword))
 
     def mark_author(self, number: int) -> None:
         """Mark author (by given number in author list)"""
-        self.author_marks[number] = True
+        self.author_marks[number] = 1
 
     def evaluate(self, keyword_ratings: dict, author_ratings: dict,
-                       rate_abstract: bool=True) -> int:
+                       rate_abstract: bool=True,
+                       keyword_matcher: KeywordMatcher=None,
+                       author_matcher: AuthorMatcher=None) -> int:
         """Evaluate entry
 
         Rate entries according to keywords and author list.
@@ -62,42 +110,298 @@ class Entry(object):
         Args:
             keywords (dict): dict with keywords as keys and rating as value
             authors (dict): dict with authors as keys and rating as value
+            keyword_matcher (KeywordMatcher): matcher compiled from `keywords`,
+                pass it when evaluating many entries to compile it only once
+            author_matcher (AuthorMatcher): matcher compiled from `authors`
         Returns:
             int: rating for this entry
         """
+        if keyword_matcher is None:
+            keyword_matcher = KeywordMatcher(keyword_ratings)
+        if author_matcher is None:
+            author_matcher = AuthorMatcher(author_ratings)
+
         # find keywords in title and abstract
-        for keyword, rating in keyword_ratings.items():
-            keyword = keyword.lower()
-            # find and mark keyword in title
-            counts = self.title.lower().count(keyword)
-            if counts > 0:
-                self.mark_title_keyword(keyword)
-                self.detailed_ratings[keyword] = counts * rating
-            # find keyword in abstract
-            if rate_abstract:
-                counts = self.abstract.lower().count(keyword)
-                if counts > 0:
-                    try:
-                        self.detailed_ratings[keyword] += counts * rating
-                    except KeyError:
-                        self.detailed_ratings[keyword] = counts * rating
-
-        # find authors
-        for author, rating in author_ratings.items():
-            for i, a in enumerate(self.authors):
-                match = re.search(r'\b{}\b'.format(author), a, flags=re.IGNORECASE)
-                if match:
-                    self.mark_author(i)
-                    self.detailed_ratings[author] = rating
-                    break  # count each author only once
+        title_matches = keyword_matcher.scan(self.title)
+        abstract_matches = keyword_matcher.scan(self.abstract) if rate_abstract else {}
+        # keep order of keywords in ratings
+        for i in sorted(title_matches.keys() | abstract_matches.keys()):
+            keyword = keyword_matcher.keywords[i]
+            rating = keyword_matcher.ratings[i]
+            spans = title_matches.get(i, ())
+            # mark keyword in title
+            for start, end in spans:
+                self.mark_title_span(start, end)
+            counts = len(spans) + len(abstract_matches.get(i, ()))
+            self.detailed_ratings[keyword] = counts * rating
+
+        # find authors, count each author only once
+        author_matches = author_matcher.match(self.authors)
+        for i in sorted(author_matches):
+            self.mark_author(author_matches[i])
+            self.detailed_ratings[author_matcher.authors[i]] = author_matcher.ratings[i]
 
         self.rating = sum(self.detailed_ratings.values())
         return self.rating
 
-def evaluate_entries(entries: list, keyword_ratings: dict, author_ratings: dict, rate_abstract: bool=True) -> list:
-    """Evaluate all entries in list"""
+
+def entry_to_dict(entry: Entry) -> dict:
+    """Convert evaluated entry to JSON serializable dict"""
+    return {
+        "id": entry.id,
+        "title": entry.title,
+        "authors": entry.authors,
+        "abstract": entry.abstract,
+        "category": entry.category,
+        "matched_categories": entry.matched_categories,
+        "date_submitted": entry.date_submitted.isoformat(),
+        "date_updated": entry.date_updated.isoformat(),
+        "rating": entry.rating,
+        "detailed_ratings": entry.detailed_ratings,
+        "title_spans": entry.title_spans,
+        "author_marks": [i for i, mark in enumerate(entry.author_marks) if mark],
+    }
+
+def entry_from_dict(data: dict) -> Entry:
+    """Convert dict from `entry_to_dict` back to evaluated entry"""
+    entry = Entry(
+        id=data["id"],
+        title=data["title"],
+        authors=data["authors"],
+        abstract=data["abstract"],
+        category=data["category"],
+        date_submitted=datetime.fromisoformat(data["date_submitted"]),
+        date_updated=datetime.fromisoformat(data["date_updated"]),
+    )
+    entry.matched_categories = data["matched_categories"]
+    entry.rating = data["rating"]
+    entry.detailed_ratings = data["detailed_ratings"]
+    entry.title_spans = [tuple(span) for span in data["title_spans"]]
+    for position in data["author_marks"]:
+        entry.mark_author(position)
+    return entry
+
+
+class EntryBatch:
+    """Columnar container for many entries
+
+    Instead of one object per entry, the fields of all entries are kept in
+    per-field lists and arrays: author names in one flat list (indexed by
+    offsets), categories as codes into a table of unique categories, dates
+    as POSIX timestamps. Detailed ratings and marks are kept only for
+    entries that match any keyword or author.
+
+    Indexing or iterating creates `Entry` objects on the fly (including
+    their evaluation results), so a batch can be passed wherever a list of
+    entries is read. Use `evaluate_entries` to rate a batch in place.
+
+    Entries are copied into the batch when they are added, changes to the
+    original entry objects afterwards (e.g. `matched_categories` extended
+    by `iter_entries`) are not reflected in the batch.
+
+    Args:
+        entries (iterable): entries to add to the batch
+    """
+
+    def __init__(self, entries=()):
+        self.ids = []
+        self.titles = []
+        self.abstracts = []
+        self._authors = []
+        self._author_offsets = array("L", [0])
+        self._categories = []
+        self._category_codes = {}
+        self._category = array("H")
+        self._matched = array("H")
+        self._matched_offsets = array("L", [0])
+        self._date_submitted = array("d")
+        self._date_updated = array("d")
+        self._ratings = array("q")
+        self._rated = bytearray()
+        # index to (detailed_ratings, title_spans, author_marks) of entries matching any term
+        self._evaluations = {}
+
+        for entry in entries:
+            self.append(entry)
+
+    def _category_code(self, category: str) -> int:
+        try:
+            return self._category_codes[category]
+        except KeyError:
+            self._category_codes[category] = len(self._categories)
+            self._categories.append(category)
+            return len(self._categories) - 1
+
+    def append(self, entry: Entry):
+        """Add entry (and its evaluation results) to the batch"""
+        self.ids.append(entry.id)
+        self.titles.append(entry.title)
+        self.abstracts.append(entry.abstract)
+        self._authors.extend(entry.authors)
+        self._author_offsets.append(len(self._authors))
+        self._category.append(self._category_code(entry.category))
+        self._matched.extend(self._category_code(cat) for cat in entry.matched_categories)
+        self._matched_offsets.append(len(self._matched))
+        self._date_submitted.append(entry.date_submitted.timestamp())
+        self._date_updated.append(entry.date_updated.timestamp())
+        self._ratings.append(0)
+        self._rated.append(0)
+        self.store_evaluation(len(self) - 1, entry)
+
+    def store_evaluation(self, index: int, entry: Entry):
+        """Keep evaluation results of entry at index"""
+        self._evaluations.pop(index, None)
+        self._rated[index] = entry.rating is not None
+        self._ratings[index] = entry.rating or 0
+        if entry.detailed_ratings:
+            self._evaluations[index] = (
+                entry.detailed_ratings, entry.title_spans, entry.author_marks
+            )
+
+    def authors(self, index: int) -> list:
+        """Author list of entry at index"""
+        return self._authors[self._author_offsets[index]:self._author_offsets[index + 1]]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> Entry:
+        if index < 0:
+            index += len(self)
+        entry = Entry(
+            id=self.ids[index],
+            title=self.titles[index],
+            authors=self.authors(index),
+            abstract=self.abstracts[index],
+            category=self._categories[self._category[index]],
+            date_submitted=datetime.fromtimestamp(self._date_submitted[index], tz=timezone.utc),
+            date_updated=datetime.fromtimestamp(self._date_updated[index], tz=timezone.utc),
+        )
+        entry.matched_categories = [
+            self._categories[code]
+            for code in self._matched[self._matched_offsets[index]:self._matched_offsets[index + 1]]
+        ]
+        if self._rated[index]:
+            entry.rating = self._ratings[index]
+        if index in self._evaluations:
+            entry.detailed_ratings, entry.title_spans, entry.author_marks = self._evaluations[index]
+        return entry
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def evaluate_entries(entries: list, keyword_ratings: dict=None, author_ratings: dict=None, rate_abstract: bool=True,
+                     workers: int=1, profile: RatingProfile=None) -> list:
+    """Evaluate all entries in list (or EntryBatch)
+
+    Pass a compiled `profile` (see `rating.load_profile`) instead of the
+    ratings to skip compiling them, `rate_abstract` is then taken from the
+    profile.
+
+    With `workers > 1` the entries are evaluated in chunks by a pool of
+    worker processes. The results are identical to the serial evaluation.
+    """
+    if profile is None:
+        profile = RatingProfile(keyword_ratings, author_ratings, rate_abstract)
+    if workers > 1:
+        _evaluate_parallel(entries, profile, workers)
+        return
+    batch = isinstance(entries, EntryBatch)
+    for i, entry in enumerate(entries):
+        profile.evaluate(entry)
+        if batch:
+            entries.store_evaluation(i, entry)
+
+# profile to evaluate entries with in worker processes, set once per process
+_worker_profile = None
+
+def _init_worker(profile: RatingProfile):
+    global _worker_profile
+    _worker_profile = profile
+
+def _evaluate_chunk(chunk: list) -> list:
+    """Evaluate (title, authors, abstract) tuples in worker process"""
+    results = []
+    for title, authors, abstract in chunk:
+        entry = Entry(id="", title=title, authors=authors, abstract=abstract)
+        _worker_profile.evaluate(entry)
+        results.append((entry.rating, entry.detailed_ratings, entry.title_spans, entry.author_marks))
+    return results
+
+def _evaluate_parallel(entries: list, profile: RatingProfile, workers: int):
+    """Evaluate entries with a process pool, the compiled profile is sent to every worker once"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    entries_list = list(entries)
+    # a few chunks per worker to balance the load
+    chunksize = max(1, len(entries_list) // (workers * 4))
+    chunks = [
+        [(entry.title, entry.authors, entry.abstract) for entry in entries_list[i:i + chunksize]]
+        for i in range(0, len(entries_list), chunksize)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(profile,)) as executor:
+        results = [result for chunk in executor.map(_evaluate_chunk, chunks) for result in chunk]
+
+    batch = isinstance(entries, EntryBatch)
+    for i, (entry, result) in enumerate(zip(entries_list, results)):
+        entry.rating, entry.detailed_ratings, entry.title_spans, entry.author_marks = result
+        if batch:
+            entries.store_evaluation(i, entry)
+
+def iter_evaluated(entries, keyword_ratings: dict=None, author_ratings: dict=None, rate_abstract: bool=True,
+                   profile: RatingProfile=None):
+    """Evaluate entries one by one as they are consumed (e.g. from `parse.iter_entries`)"""
+    if profile is None:
+        profile = RatingProfile(keyword_ratings, author_ratings, rate_abstract)
     for entry in entries:
-        entry.evaluate(keyword_ratings, author_ratings, rate_abstract)
+        profile.evaluate(entry)
+        yield entry
+
+
+class EntryRanker:
+    """Streaming ranking of evaluated entries
+
+    Entries are added one by one, only entries with rating >= rating_min
+    are kept, and of those only the `length` best (or worst, if `reverse`)
+    in a bounded heap, so memory does not grow with the number of entries.
+    `results()` gives the same list as `sort_entries` would.
+
+    Args:
+        rating_min (int): minimum rating of listed entries
+        reverse (bool): lowest ranked entry on top
+        length (int): maximum number of listed entries, all if negative
+    """
+
+    def __init__(self, rating_min: int, reverse: bool, length: int):
+        self.rating_min = rating_min
+        self.reverse = reverse
+        self.length = None if length is None or length < 0 else length
+        self._heap = []
+        self._count = 0
+
+    def add(self, entry: Entry) -> bool:
+        """Add evaluated entry, returns if its rating qualifies for the list"""
+        if entry.rating < self.rating_min:
+            return False
+        self._count += 1
+        # heap keeps the entry to drop next on top: lowest rating (highest
+        # rating if reversed), latest entry for equal ratings
+        item = (-entry.rating if self.reverse else entry.rating, -self._count, entry)
+        if self.length is None:
+            self._heap.append(item)
+        elif len(self._heap) < self.length:
+            heapq.heappush(self._heap, item)
+        elif self.length > 0:
+            heapq.heappushpop(self._heap, item)
+        return True
+
+    def results(self) -> list:
+        """Ranked list of entries, most relevant on top (unless reversed)"""
+        return [item[2] for item in sorted(self._heap, key=lambda item: (-item[0], -item[1]))]
+
 
 def sort_entries(entries: list, rating_min: int, reverse: bool, length: int) -> list:
     ''' Sort entries by rating
@@ -107,12 +411,7 @@ def sort_entries(entries: list, rating_min: int, reverse: bool, length: int) ->
     (after cutting the list to length entries). Note that the default order
     is most relevant paper on top.
     '''
-    if length < 0:
-        length = None
-
-    # remove entries with low rating
-    entries_filtered = filter(lambda entry: entry.rating >= rating_min, entries)
-    # sort by rating
-    results = sorted(entries_filtered, key=lambda x: x.rating, reverse=not reverse)
-
-    return results[:length]
+    ranker = EntryRanker(rating_min, reverse, length)
+    for entry in entries:
+        ranker.add(entry)
+    return ranker.results()
@@ -0,0 +1,184 @@
+"""Compiled matchers for rating keywords and authors"""
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton finding all keywords in a single pass over a text
+
+    Matching is case-insensitive. Occurrences are counted like `str.count`
+    does, i.e. overlapping occurrences of the same keyword are only counted
+    once.
+
+    Args:
+        keyword_ratings (dict): dict with keywords as keys and rating as value
+    """
+
+    def __init__(self, keyword_ratings: dict):
+        # keywords in config order, lowercase and without duplicates
+        self.keywords = []
+        self.ratings = []
+        index = {}
+        for keyword, rating in keyword_ratings.items():
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            if keyword in index:
+                self.ratings[index[keyword]] = rating
+            else:
+                index[keyword] = len(self.keywords)
+                self.keywords.append(keyword)
+                self.ratings.append(rating)
+
+        # trie of keywords: transitions, fail links, and keywords ending in each state
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for i, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state] += (i,)
+
+        # breadth first construction of fail links
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in self._goto[state].items():
+                pending.append(child)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def scan(self, text: str) -> dict:
+        """Find all keywords in text
+
+        Returns:
+            dict: keyword index (position in `keywords`) to list of `(start, end)`
+                  spans of the non-overlapping occurrences in `text.lower()`
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        keywords = self.keywords
+        matches = {}
+        last_end = {}
+        state = 0
+        for pos, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for i in out[state]:
+                end = pos + 1
+                start = end - len(keywords[i])
+                # occurrences of a keyword are reported in order, skip overlapping ones
+                if start >= last_end.get(i, 0):
+                    last_end[i] = end
+                    matches.setdefault(i, []).append((start, end))
+        return matches
+
+
+# TeX accent commands, e.g. `\"o`, `\'{e}` or `{\v c}`
+_tex_accent = re.compile(r"\\[`'^\"~=.uvHckbdrt]\s*\{?\s*(\w)\s*\}?")
+_tex_command = re.compile(r"\\([a-zA-Z]+)\s*")
+
+@lru_cache(maxsize=65536)
+def name_tokens(name: str) -> tuple:
+    """Normalize author name into lowercase tokens without accents
+
+    TeX accents and unicode diacritics are stripped, e.g. `Schr\\"{o}dinger`
+    and `Schrödinger` both become `("schrodinger",)`.
+    """
+    name = _tex_accent.sub(r"\1", name)
+    name = _tex_command.sub(r"\1", name)
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return tuple(re.findall(r"\w+", name.lower()))
+
+def _tokens_match(configured: str, token: str) -> bool:
+    """Compare name tokens, single letters are taken as initials"""
+    if configured == token:
+        return True
+    if len(configured) == 1 or len(token) == 1:
+        return configured[0] == token[0]
+    return False
+
+def _tokens_in_order(configured: tuple, tokens: tuple) -> bool:
+    """Check if configured tokens match tokens in order, skipping other tokens in between"""
+    i = 0
+    for token in tokens:
+        if i == len(configured):
+            break
+        if _tokens_match(configured[i], token):
+            i += 1
+    return i == len(configured)
+
+
+class AuthorMatcher:
+    """Index of configured authors for matching author lists
+
+    A configured author matches an author of an entry if its name tokens
+    (see `name_tokens`) appear in the same order in the author's name, where
+    an initial matches any name starting with that letter and further names
+    of the author (e.g. middle initials) are skipped. E.g. `Alpher` and
+    `R. Alpher` both match `Ralph A. Alpher`.
+
+    Configured authors are indexed by the last token of their name that is
+    not an initial (usually the surname), so matching an author list needs
+    one hash lookup per name token.
+
+    Args:
+        author_ratings (dict): dict with authors as keys and rating as value
+    """
+
+    def __init__(self, author_ratings: dict):
+        self.authors = []
+        self.ratings = []
+        self._index = {}
+        for author, rating in author_ratings.items():
+            tokens = name_tokens(author)
+            if not tokens:
+                continue
+            anchor = max(
+                (i for i, token in enumerate(tokens) if len(token) > 1),
+                default=len(tokens) - 1,
+            )
+            self._index.setdefault(tokens[anchor], []).append(
+                (len(self.authors), anchor, tokens)
+            )
+            self.authors.append(author)
+            self.ratings.append(rating)
+
+    def __len__(self) -> int:
+        return len(self.authors)
+
+    def match(self, authors: list) -> dict:
+        """Find configured authors in author list
+
+        Returns:
+            dict: configured author index (position in `authors`) to the
+                  position of the first matching author in `authors`
+        """
+        index = self._index
+        matches = {}
+        for position, author in enumerate(authors):
+            tokens = name_tokens(author)
+            for t, token in enumerate(tokens):
+                for i, anchor, configured in index.get(token, ()):
+                    if i in matches:
+                        continue
+                    # names before and after the anchor (usually the surname)
+                    if (_tokens_in_order(configured[:anchor], tokens[:t])
+                            and _tokens_in_order(configured[anchor + 1:], tokens[t + 1:])):
+                        matches[i] = position
+        return matches
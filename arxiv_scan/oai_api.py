@@ -1,3 +1,20 @@
+"""Access to the OAI-PMH interface of arXiv"""
+import gzip
+import hashlib
+import http.client
+import logging
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+
 namespaces = {
         "oai": "http://www.openarchives.org/OAI/2.0/",
         "oai_dc": "http://www.openarchives.org/OAI/2.0/oai_dc/",
@@ -10,3 +27,269 @@ base_url = "https://export.arxiv.org/oai2"
 attempts = 10
 
 delay = 1
+
+
+class RateLimiter:
+    """Spacing of requests to the OAI API, shared between threads
+
+    Every request has to `wait()` for its turn, consecutive requests are
+    started at least `delay` seconds apart. When the server asks to retry
+    later (503 with Retry-After), `pause()` holds back all requests.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        """Block until the next request may be sent"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.delay
+        time.sleep(start - now)
+
+    def pause(self, seconds: float):
+        """Hold back all requests for the given time"""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+rate_limiter = RateLimiter(delay)
+
+
+# retry delay for transient errors: backoff_base * 2**attempt seconds, at most backoff_max
+backoff_base = 1
+backoff_max = 60
+
+# timeout for a single request in seconds
+timeout = 60
+
+
+class Response:
+    """Response of the OAI API
+
+    Attributes:
+        url (str): requested URL
+        status (int): HTTP status code
+        headers (http.client.HTTPMessage): response headers
+        data (bytes): (decompressed) response body
+        size (int): number of bytes transferred (compressed)
+        elapsed (float): duration of the request in seconds
+    """
+
+    def __init__(self, url, status, headers, data, size, elapsed):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.data = data
+        self.size = size
+        self.elapsed = elapsed
+
+
+class ResponseCache:
+    """Raw responses of the OAI API stored on disk, keyed by request URL
+
+    Every response is stored as a gzip compressed file named after the
+    SHA-256 hash of its URL.
+
+    Args:
+        directory (Path): directory for the cached responses
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url: str) -> Path:
+        return self.directory / (hashlib.sha256(url.encode()).hexdigest() + ".xml.gz")
+
+    def get(self, url: str) -> bytes:
+        """Cached response for URL, None if not cached"""
+        try:
+            with gzip.open(self._path(url), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url: str, data: bytes):
+        """Store response for URL"""
+        path = self._path(url)
+        # write to temporary file first, so readers never see partial files; thread
+        # idents are only unique within a process, concurrent runs may share the cache
+        temporary = path.with_suffix(".tmp{:d}-{:d}".format(os.getpid(), threading.get_ident()))
+        with gzip.open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+
+class OAIClient:
+    """HTTP client for the OAI API with persistent connections
+
+    Connections are kept alive and reused across requests (resumption pages,
+    categories, threads), responses are requested gzip compressed. All
+    requests are spaced by a shared `RateLimiter`. Transient errors
+    (connection problems, 5xx) are retried with exponential backoff and
+    jitter, a 503 with Retry-After pauses all requests using the limiter.
+
+    The client counts requests, transferred bytes and time spent waiting for
+    responses.
+
+    With a `ResponseCache`, every successful response is stored in the
+    cache. In `offline` mode, all responses are served from the cache
+    without contacting the server.
+
+    Args:
+        base_url (str): URL of the OAI endpoint
+        limiter (RateLimiter): limiter to use (default: module `rate_limiter`)
+        cache (ResponseCache): cache to store responses in (default: None)
+        offline (bool): serve responses from cache only (default: False)
+    """
+
+    def __init__(self, base_url: str = base_url, limiter: RateLimiter = None,
+                 cache: ResponseCache = None, offline: bool = False):
+        if offline and cache is None:
+            raise ValueError("Offline mode needs a response cache")
+        self.base_url = base_url
+        self.limiter = limiter if limiter is not None else rate_limiter
+        self.cache = cache
+        self.offline = offline
+        url = urllib.parse.urlsplit(base_url)
+        self._connection_class = (
+            http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        )
+        self._host = url.netloc
+        self._path = url.path
+        self._idle = []
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.bytes_transferred = 0
+        self.elapsed = 0.0
+
+    def _connection(self, timeout: float):
+        """Get idle connection (or open a new one), returns `(connection, reused)`"""
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            return self._connection_class(self._host, timeout=timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def _release(self, connection):
+        with self._lock:
+            self._idle.append(connection)
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _request(self, query: str, headers: dict, timeout: float) -> Response:
+        url = f"{self.base_url:s}?{query:s}"
+        connection, reused = self._connection(timeout)
+        start = time.monotonic()
+        while True:
+            try:
+                connection.request("GET", f"{self._path:s}?{query:s}", headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if not reused:
+                    raise
+                # server closed the idle connection, try again with a new one
+                connection, reused = self._connection_class(self._host, timeout=timeout), False
+            except Exception:
+                connection.close()
+                raise
+            else:
+                break
+        elapsed = time.monotonic() - start
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+
+        size = len(data)
+        if response.headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+
+        with self._lock:
+            self.requests += 1
+            self.bytes_transferred += size
+            self.elapsed += elapsed
+        logger.debug(f"{response.status:d} {url:s} ({size:d} bytes in {elapsed:.2f}s)")
+        return Response(url, response.status, response.headers, data, size, elapsed)
+
+    def _replay(self, query: str) -> Response:
+        url = f"{self.base_url:s}?{query:s}"
+        data = self.cache.get(url)
+        if data is None:
+            raise FileNotFoundError(f"Response not in cache (offline mode): {url:s}")
+        logger.debug(f"cached {url:s}")
+        return Response(url, 200, http.client.HTTPMessage(), data, 0, 0.0)
+
+    def get(self, query: str, headers: dict = None, timeout: float = timeout,
+            attempts: int = attempts) -> Response:
+        """Send request to OAI API
+
+        Returns responses with status 2xx and 304 (Not Modified), other
+        status codes raise `urllib.error.HTTPError`. Connection errors and
+        server errors are retried up to `attempts` times.
+
+        In offline mode, `FileNotFoundError` is raised if the response is
+        not cached.
+
+        Args:
+            query (str): query string, e.g. `verb=ListSets`
+            headers (dict): additional request headers
+            timeout (float): timeout of the request in seconds
+            attempts (int): number of attempts before giving up
+        """
+        if self.offline:
+            return self._replay(query)
+
+        headers = dict(headers or {}, **{"Accept-Encoding": "gzip"})
+
+        for attempt in range(attempts):
+            self.limiter.wait()
+            try:
+                response = self._request(query, headers, timeout)
+            except (OSError, http.client.HTTPException) as err:
+                error = err
+            else:
+                if response.status < 400:
+                    if self.cache is not None and response.status == 200:
+                        self.cache.put(response.url, response.data)
+                    return response
+                error = urllib.error.HTTPError(response.url, response.status, None, response.headers, None)
+                if response.status == 503 and "Retry-After" in response.headers:
+                    # server asks everybody to slow down
+                    self.limiter.pause(int(response.headers["Retry-After"]))
+                    continue
+                if response.status < 500:
+                    raise error
+
+            if attempt + 1 < attempts:
+                backoff = min(backoff_max, backoff_base * 2 ** attempt)
+                logger.info(f"Request failed ({error!r}), retrying in up to {backoff:.0f}s")
+                time.sleep(random.uniform(0.5, 1) * backoff)
+
+        raise error
+
+
+_client = None
+
+def default_client() -> OAIClient:
+    """Client for `base_url` shared by all functions that are not given a client"""
+    global _client
+    if _client is None:
+        _client = OAIClient(base_url)
+    return _client
@@ -1,6 +1,7 @@
 """Functions related to outputting to terminal"""
 
 import logging
+from bisect import bisect_right
 
 from termcolor import colored
 
@@ -8,10 +9,51 @@ from termcolor import colored
 logger = logging.getLogger(__name__)
 
 
+def wrap_lines(text: str, width: int) -> list:
+    """Split text into lines at the first space after every `width` characters
+
+    Returns:
+        list of (start, end) positions of the lines, the spaces at the line
+        breaks are dropped
+    """
+    lines = []
+    start = 0
+    end = text.find(' ', start + width + 1)
+    while end >= 0:
+        lines.append((start, end))
+        start = end + 1
+        end = text.find(' ', start + width + 1)
+    lines.append((start, len(text)))
+    return lines
+
+
+def colored_spans(text: str, spans: list, color: str, start: int = 0, end: int = None) -> str:
+    """Colour the given (sorted, non-overlapping) spans of text[start:end]"""
+    if end is None:
+        end = len(text)
+    parts = []
+    pos = start
+    # skip spans starting before the one (possibly) overlapping start
+    first = max(bisect_right(spans, (start, start)) - 1, 0)
+    for span_start, span_end in spans[first:]:
+        if span_start >= end:
+            break
+        span_start, span_end = max(span_start, pos), min(span_end, end)
+        if span_start >= span_end:
+            continue
+        parts.append(text[pos:span_start])
+        parts.append(colored(text[span_start:span_end], color))
+        pos = span_end
+    parts.append(text[pos:end])
+    return ''.join(parts)
+
+
 def print_entries(entries: list):
     ''' Print all entries'''
     for i, entry in enumerate(entries):
-        rating = colored('({:2d})'.format(entry.rating), 'green')
+        # search results are rated by (fractional) BM25 scores
+        rating_format = '({:3.1f})' if isinstance(entry.rating, float) else '({:2d})'
+        rating = colored(rating_format.format(entry.rating), 'green')
         authors = []
         authors_len = 0
         for i, a in enumerate(entry.authors):
@@ -25,19 +67,10 @@ def print_entries(entries: list):
                 authors.append(colored(a, attrs=['underline']))
         authors = colored(', ', attrs=['underline']).join(authors)
 
-        title_lines = [[]]
-        title_len = 0
-        for i, t in enumerate(entry.title):
-            if t == ' ' and title_len > 90:
-                title_len = 0
-                title_lines.append([])
-                continue
-            title_len += 1
-            if i in entry.title_marks:
-                title_lines[-1].append(colored(t, 'blue'))
-            else:
-                title_lines[-1].append(t)
-        title_lines = [''.join(t) for t in title_lines]
+        title_lines = [
+            colored_spans(entry.title, entry.title_spans, 'blue', start, end)
+            for start, end in wrap_lines(entry.title, 90)
+        ]
 
         print('{rating:s} {arxiv:s}{id:s}'.format(
             rating=rating,
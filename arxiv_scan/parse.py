@@ -1,19 +1,29 @@
 """Functions relating to parsing Arxiv.org"""
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Iterator
 from xml.etree import ElementTree
 
-import urllib
-import urllib.request
-import time
+import io
 import logging
-import pytz
+import queue
+import re
+import threading
+import urllib.parse
+from zoneinfo import ZoneInfo
 
 from .entry_evaluation import Entry
-from .oai_api import namespaces, base_url, attempts, delay
+from .oai_api import OAIClient, default_client, namespaces
+from .stats import Counters
+from .store import RecordStore
 
 
 logger = logging.getLogger(__name__)
 
+# number of harvested records written to the record store at once
+store_batch_size = 100
+
 
 def linebreak_fix(text: str):
     """Replace linebreaks and indenting with single space"""
@@ -27,119 +37,413 @@ def datetime_fromisoformat(datestr: str):
     """
     return datetime.strptime(datestr, "%Y-%m-%dT%H:%M:%S")
 
-def xml2entry(record: ElementTree.Element, namespaces: dict) -> Entry:
-    """Convert entry from an XML object to an Entry object"""
-    identifier = record.find('./oai:header/oai:identifier', namespaces=namespaces).text
-    categories = record.findall('./oai:header/oai:setSpec', namespaces=namespaces)
+_months = {
+    month: number for number, month in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1
+    )
+}
+
+@lru_cache(maxsize=4096)
+def version_date(datestr: str) -> datetime:
+    """Convert arXivRaw version date (e.g. `Mon, 2 Apr 2007 19:18:42 GMT`) to UTC datetime
+
+    The fixed format is split directly instead of using `datetime.strptime`,
+    which is one of the slowest steps of decoding a record. Results are
+    memoized, as versions of a harvest often share timestamps.
+    """
+    try:
+        _, day, month, year, clock, zone = datestr.split()
+        hour, minute, second = clock.split(":")
+        if zone not in ("GMT", "UTC"):
+            raise ValueError(zone)
+        return datetime(int(year), _months[month], int(day),
+                        int(hour), int(minute), int(second), tzinfo=timezone.utc)
+    except (ValueError, KeyError):
+        # unexpected layout, let strptime decide (and raise a meaningful error)
+        return datetime.strptime(datestr, "%a, %d %b %Y %H:%M:%S %Z").replace(tzinfo=timezone.utc)
+
+def record_id(record: ElementTree.Element, namespaces: dict) -> str:
+    """Get arXiv id of record"""
+    return record.find('./oai:header/oai:identifier', namespaces=namespaces).text.split(":")[-1]
+
+def record_category(record: ElementTree.Element, namespaces: dict) -> str:
+    """Get primary category (first setSpec) of record"""
+    return record.find('./oai:header/oai:setSpec', namespaces=namespaces).text
+
+def record_dates(record: ElementTree.Element, namespaces: dict) -> tuple:
+    """Get dates `(submitted, updated)` of the first and the last version of record"""
+    versions = record.findall('./oai:metadata/arxivraw:arXivRaw/arxivraw:version', namespaces=namespaces)
+    submitted = versions[0].find('./arxivraw:date', namespaces=namespaces).text
+    updated = versions[-1].find('./arxivraw:date', namespaces=namespaces).text
+    return version_date(submitted), version_date(updated)
+
+def record_text(record: ElementTree.Element, namespaces: dict) -> tuple:
+    """Get `(title, authors, abstract)` of record, authors as list, without linebreaks"""
     title = record.find('./oai:metadata/arxivraw:arXivRaw/arxivraw:title', namespaces=namespaces).text
     authors = record.find('./oai:metadata/arxivraw:arXivRaw/arxivraw:authors', namespaces=namespaces).text
     abstract = record.find('./oai:metadata/arxivraw:arXivRaw/arxivraw:abstract', namespaces=namespaces).text
-    versions = record.findall('./oai:metadata/arxivraw:arXivRaw/arxivraw:version', namespaces=namespaces)
-    dates = []
-    for version in versions:
-        dates.append(version.find('./arxivraw:date', namespaces=namespaces).text)
+    return linebreak_fix(title), [author.strip() for author in authors.split(',')], linebreak_fix(abstract)
+
+def xml2entry(record: ElementTree.Element, namespaces: dict, dates: tuple = None) -> Entry:
+    """Convert entry from an XML object to an Entry object
+
+    The version dates can be passed if they have been decoded already (see `record_dates`).
+    """
+    title, authors, abstract = record_text(record, namespaces)
+    if dates is None:
+        dates = record_dates(record, namespaces)
     return Entry(
-        id=identifier.split(":")[-1],
-        title=linebreak_fix(title),
-        authors=[author.strip() for author in authors.split(',')],
-        abstract=linebreak_fix(abstract),
-        category=categories[0].text,
-        date_submitted=pytz.utc.localize(datetime.strptime(dates[0], "%a, %d %b %Y %H:%M:%S %Z")),
-        date_updated=pytz.utc.localize(datetime.strptime(dates[-1], "%a, %d %b %Y %H:%M:%S %Z")),
+        id=record_id(record, namespaces),
+        title=title,
+        authors=authors,
+        abstract=abstract,
+        category=record_category(record, namespaces),
+        date_submitted=dates[0],
+        date_updated=dates[1],
+    )
+
+def record_datestamp(record: ElementTree.Element, namespaces: dict) -> str:
+    """Get OAI datestamp (`YYYY-MM-DD`) of record"""
+    return record.find('./oai:header/oai:datestamp', namespaces=namespaces).text
+
+def keep_entry(entry: Entry, category: str, cutoff_date: datetime,
+               cross_lists: bool, resubmissions: bool) -> bool:
+    """Check if entry harvested from category passes the cross-list and date filters"""
+    return (
+        keep_category(entry.category, category, cross_lists)
+        and keep_dates((entry.date_submitted, entry.date_updated), cutoff_date, resubmissions)
     )
 
+def keep_category(primary_category: str, category: str, cross_lists: bool) -> bool:
+    """Check if a record with primary category harvested from category passes the cross-list filter"""
+    # the following matches indicate that it's NOT crossref
+    # "physics:astro-ph:EP" startswith "physics"
+    # "physics:astro-ph:EP" startswith "physics:astro-ph"
+    # "physics:astro-ph:EP" startswith "physics:astro-ph:EP"
+    return cross_lists or primary_category.startswith(category)
+
+def keep_dates(dates: tuple, cutoff_date: datetime, resubmissions: bool) -> bool:
+    """Check if dates `(submitted, updated)` of a record pass the date filter"""
+    if resubmissions:
+        # if resubmissions are allowed: compare last date (update date)
+        return dates[1] >= cutoff_date
+    # if resubmissions are not allowed: compare first date (submission date)
+    return dates[0] >= cutoff_date
+
+def iter_records(source) -> Iterator[ElementTree.Element]:
+    """Incrementally parse a ListRecords response
+
+    Every `<record>` element is yielded as soon as it is closed and cleared
+    afterwards, so only one record at a time is kept in memory. The
+    `<resumptionToken>` element (if any) is yielded as well.
+
+    Args:
+        source: file-like object with the XML response
+
+    Yields:
+        xml.etree.ElementTree.Element
+    """
+    list_tag = "{{{:s}}}ListRecords".format(namespaces["oai"])
+    record_tag = "{{{:s}}}record".format(namespaces["oai"])
+    token_tag = "{{{:s}}}resumptionToken".format(namespaces["oai"])
+    parent = None
+
+    for event, element in ElementTree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if element.tag == list_tag:
+                parent = element
+        elif element.tag == record_tag:
+            yield element
+            element.clear()
+            parent.remove(element)
+        elif element.tag == token_tag:
+            yield element
+
+def _put(channel: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put item into queue, unless the consumer gives up (sets `stop`) first"""
+    while not stop.is_set():
+        try:
+            channel.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+_resumption_pattern = re.compile(rb"<resumptionToken[^>]*>([^<]*)</resumptionToken>")
+
+def resumption_token(data: bytes) -> str:
+    """Find resumptionToken in raw ListRecords response, None on the last page"""
+    # the token is at the very end of the response, skip scanning the records
+    match = _resumption_pattern.search(data, max(data.rfind(b"<resumptionToken"), 0))
+    if match is None or not match.group(1).strip():
+        return None
+    return urllib.parse.unquote(match.group(1).decode())
+
+
+class PageFetcher:
+    """Iterate over the pages of a ListRecords request, prefetching the next page
+
+    The pages are downloaded in a background thread, which requests the next
+    page as soon as the resumptionToken of the current page is known, while
+    the current page is still being decoded. Requests are spaced by the
+    rate limiter of the client.
+
+    Yields tuples `(data, skip)` with the raw response and the number of
+    records to skip at the start of the page.
+
+    Args:
+        query (str): query of the first page
+        client (OAIClient): client used for the requests
+    """
+
+    def __init__(self, query: str, client: OAIClient):
+        self._client = client
+        self._queue = queue.Queue(maxsize=1)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(query,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        return _put(self._queue, item, self._stop)
+
+    def _run(self, query: str):
+        skip = 0
+        try:
+            while True:
+                data = self._client.get(query).data
+                resumption = resumption_token(data)
+                if not self._put((data, skip)) or resumption is None:
+                    break
+
+                query = resumption.split("&skip=")[0]
+                skip = int(resumption.split("&skip=")[1])
+                if self._stop.is_set():
+                    break
+        except Exception as err:
+            self._put(err)
+        self._put(None)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        """Stop fetching pages"""
+        self._stop.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 def get_entries(
     categories: list,
     cutoff_date: datetime,
     cross_lists: bool = True,
     resubmissions: bool = False,
+    store: RecordStore = None,
+    workers: int = 4,
+    client: OAIClient = None,
+    counters: Counters = None,
 ) -> list:
     """Get arXiv submissions from now back to cutoff_date
 
-    Args:
-        categories (list): List of arXiv subjects (e.g. `physics:astro-ph:EP`)
-        cutoff_date (datetime.datetime): Get submissions since this date
-        cross_lists (:obj:`bool`, optional): Include cross-lists (default: True)
-        resubmissions (:obj:`bool`, optional): Show also resubmissions (default: False)
+    Collects all entries from `iter_entries`, see there for the arguments.
 
     Returns:
         list of Entry
     """
+    return list(iter_entries(categories, cutoff_date, cross_lists, resubmissions, store, workers, client, counters))
 
-    entries = []
-
-    date_from = cutoff_date.strftime("%Y-%m-%d")
-
-    for category in categories:
+def iter_entries(
+    categories: list,
+    cutoff_date: datetime,
+    cross_lists: bool = True,
+    resubmissions: bool = False,
+    store: RecordStore = None,
+    workers: int = 4,
+    client: OAIClient = None,
+    counters: Counters = None,
+) -> Iterator[Entry]:
+    """Iterate over arXiv submissions from now back to cutoff_date
+
+    Categories are harvested concurrently, sharing the connections and the
+    rate limiter of the client. Within a category, the next page is downloaded
+    while the current one is parsed, every entry is yielded as soon as its
+    record is complete.
+
+    Entries are unique by arXiv id: a paper found in several of the
+    categories is only yielded once, all categories it was found in are
+    listed in its `matched_categories` attribute (which may still be
+    extended after the entry has been yielded).
+
+    If a record store is given, only records changed since the last harvest
+    of a category are requested from the server, everything older is
+    served from the store.
 
-        category_url = urllib.parse.quote(category)
-        url = f"{base_url:s}?verb=ListRecords&metadataPrefix=arXivRaw&from={date_from:s}&set={category_url:s}"
-        skip = 0
+    Args:
+        categories (list): List of arXiv subjects (e.g. `physics:astro-ph:EP`)
+        cutoff_date (datetime.datetime): Get submissions since this date
+        cross_lists (:obj:`bool`, optional): Include cross-lists (default: True)
+        resubmissions (:obj:`bool`, optional): Show also resubmissions (default: False)
+        store (:obj:`RecordStore`, optional): Local record store for incremental harvesting
+        workers (:obj:`int`, optional): Number of categories harvested at the same time (default: 4)
+        client (:obj:`OAIClient`, optional): Client for the OAI API (default: `oai_api.default_client()`)
+        counters (:obj:`Counters`, optional): Count pages and records (see `stats.Counters`)
 
-        while True:
-            logger.debug(f'Query: {url:s}')
-
-            for i in range(attempts):
-                try:
-                    xml_data = urllib.request.urlopen(url)
-                except urllib.error.HTTPError as err:
-                    if err.code == 503:
-                        timeout = int(err.headers['Retry-After'])
-                        time.sleep(timeout)
-                    else:
-                        raise err
-                else:
-                    with xml_data:
-                        tree = ElementTree.parse(xml_data)
+    Yields:
+        Entry
+    """
+    if client is None:
+        client = default_client()
+    channel = queue.Queue(maxsize=1000)
+    stop = threading.Event()
+
+    def harvest(category):
+        entries = iter_category(category, cutoff_date, cross_lists, resubmissions, store, client, counters)
+        try:
+            for entry in entries:
+                if not _put(channel, (category, entry), stop):
                     break
+        except Exception as err:
+            _put(channel, err, stop)
+        finally:
+            entries.close()
+        _put(channel, (category, None), stop)
+
+    index = {}
+    remaining = len(categories)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, remaining)))
+    try:
+        for category in categories:
+            executor.submit(harvest, category)
+
+        while remaining > 0:
+            item = channel.get()
+            if isinstance(item, Exception):
+                raise item
+            category, entry = item
+            if entry is None:
+                remaining -= 1
+            elif entry.id in index:
+                if counters is not None:
+                    counters.add("records_duplicate")
+                if category not in index[entry.id]:
+                    index[entry.id].append(category)
+            else:
+                entry.matched_categories.append(category)
+                # only keep the category list, so entries can be freed by the consumer
+                index[entry.id] = entry.matched_categories
+                yield entry
+    finally:
+        stop.set()
+        # categories waiting for a worker are not harvested any more
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_category(
+    category: str,
+    cutoff_date: datetime,
+    cross_lists: bool = True,
+    resubmissions: bool = False,
+    store: RecordStore = None,
+    client: OAIClient = None,
+    counters: Counters = None,
+) -> Iterator[Entry]:
+    """Iterate over arXiv submissions of a single category, see `iter_entries`"""
+    if client is None:
+        client = default_client()
+    if counters is None:
+        counters = Counters()
 
-            root = tree.getroot()
-            records = root.findall("./oai:ListRecords/oai:record", namespaces=namespaces)
+    date_from = cutoff_date.strftime("%Y-%m-%d")
 
-            if len(records) == 0:
-                break
+    harvest_from = date_from
+    if store is not None:
+        stored_from = date_from
+        coverage = store.coverage(category)
+        if coverage is not None and coverage[0] <= date_from <= coverage[1]:
+            # window is (partially) stored already, only get the delta
+            stored_from, harvest_from = coverage
+            logger.info(f"Serving {category:s} from store up to {harvest_from:s}")
+        watermark = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    harvested = set()
+
+    category_url = urllib.parse.quote(category)
+    query = f"verb=ListRecords&metadataPrefix=arXivRaw&from={harvest_from:s}&set={category_url:s}"
+
+    with PageFetcher(query, client) as pages:
+        for page_data, skip in pages:
+            n_records = 0
+            n_kept = 0
+            page = []
+            for element in iter_records(io.BytesIO(page_data)):
+                if element.tag.endswith("resumptionToken"):
+                    continue
 
-            for r, record in enumerate(records):
+                n_records += 1
+                if n_records <= skip:
+                    continue
 
-                if r < skip:
+                # decode the header fields first, only build entries that pass the filters
+                primary_category = record_category(element, namespaces)
+                if store is None and not keep_category(primary_category, category, cross_lists):
+                    continue
+                dates = record_dates(element, namespaces)
+                keep = (keep_category(primary_category, category, cross_lists)
+                        and keep_dates(dates, cutoff_date, resubmissions))
+                if store is None and not keep:
                     continue
 
-                entry = xml2entry(record, namespaces)
-
-                if not cross_lists:
-                    if not entry.category.startswith(category):
-                        # the following matches indicate that it's NOT crossref
-                        # "physics:astro-ph:EP" startswith "physics"
-                        # "physics:astro-ph:EP" startswith "physics:astro-ph"
-                        # "physics:astro-ph:EP" startswith "physics:astro-ph:EP"
-                        continue  # skip
-
-                if resubmissions:
-                    # if resubmissions are allowed: compare last date (update date)
-                    if entry.date_updated < cutoff_date:
-                        continue  # skip
-                else:
-                    # if resubmissions are not allowed: compare first date (submission date)
-                    if entry.date_submitted < cutoff_date:
-                        continue  # skip
-
-                entries.append(entry)
-
-            resumption = root.find("./oai:ListRecords/oai:resumptionToken", namespaces=namespaces)
-            if resumption is None:
+                id = record_id(element, namespaces)
+                title, authors, abstract = record_text(element, namespaces)
+                if store is not None:
+                    # every record goes into the store, entries are only built if kept
+                    harvested.add(id)
+                    page.append((id, record_datestamp(element, namespaces), title, authors, abstract,
+                                 primary_category, dates[0], dates[1]))
+                    if len(page) >= store_batch_size:
+                        store.add_records(page, category)
+                        page = []
+
+                if keep:
+                    n_kept += 1
+                    yield Entry(id=id, title=title, authors=authors, abstract=abstract, category=primary_category,
+                                date_submitted=dates[0], date_updated=dates[1])
+
+            if store is not None:
+                store.add_records(page, category)
+
+            # counted once per page, to keep the lock out of the record loop
+            n_parsed = max(n_records - skip, 0)
+            counters.add("pages")
+            counters.add("records_parsed", n_parsed)
+            counters.add("records_kept", n_kept)
+            counters.add("records_skipped", n_parsed - n_kept)
+
+            if n_records == 0:
                 break
 
-            resumption = urllib.parse.unquote(resumption.text)
-            next_url = resumption.split("&skip=")[0]
-            skip = int(resumption.split("&skip=")[1])
-
-            url = f"{base_url:s}?{next_url:s}"
-            time.sleep(delay)  # play nice
+    if store is not None:
+        # harvest was successful, serve the rest of the window from disk
+        def keep(primary_category, dates):
+            return (keep_category(primary_category, category, cross_lists)
+                    and keep_dates(dates, cutoff_date, resubmissions))
 
-    return entries
+        for entry in store.entries(category, date_from, keep):
+            if entry.id in harvested:
+                continue
+            counters.add("records_from_store")
+            yield entry
+        store.set_coverage(category, stored_from, watermark)
 
 
-def submission_window_start(date: datetime, tz=pytz.timezone("US/Eastern")):
+def submission_window_start(date: datetime, tz=ZoneInfo("America/New_York")):
     """Find start of latest submission window of arxiv.org
 
     Submission window reference: https://arxiv.org/help/availability
@@ -166,3 +470,28 @@ def submission_window_start(date: datetime, tz=pytz.timezone("US/Eastern")):
     return date_tz.replace(hour=14, minute=0, second=0, microsecond=0) - timedelta(
         days=offset
     )
+
+def parse_date(date) -> datetime:
+    """Convert `date` option into the cutoff date of the submissions to show"""
+    # parse date string
+    if date == "new" or date is None:
+        cutoff_date = submission_window_start(datetime.now().astimezone())
+    elif date == "recent":
+        cutoff_date = submission_window_start(
+            datetime.now().astimezone() - timedelta(days=6)
+        )
+    elif isinstance(date, int):
+        cutoff_date = (
+            datetime.now().astimezone().replace(hour=0, minute=0,second=0, microsecond=0)
+            - timedelta(days=date)
+        )
+    else:
+        try:
+            cutoff_date = datetime.strptime(date, "%Y-%m").astimezone()
+        except ValueError:
+            try:
+                cutoff_date = datetime.strptime(date, "%Y-%m-%d").astimezone()
+            except ValueError:
+                raise ValueError("Couldn't parse parameter 'date' from argument or config file") from None
+
+    return cutoff_date
@@ -0,0 +1,137 @@
+"""Compiled rating profiles and their cache"""
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+
+from . import __version__
+from .matching import AuthorMatcher, KeywordMatcher
+
+
+logger = logging.getLogger(__name__)
+
+
+class RatingProfile:
+    """Immutable, compiled keyword and author ratings of a config
+
+    Holds the normalized keywords and authors with their ratings, the
+    matchers compiled from them and whether abstracts are rated, i.e.
+    everything needed to evaluate entries. Profiles can be pickled, see
+    `load_profile` for the cache.
+
+    Args:
+        keyword_ratings (dict): dict with keywords as keys and rating as value
+        author_ratings (dict): dict with authors as keys and rating as value
+        rate_abstract (:obj:`bool`, optional): count keywords in abstracts (default: True)
+    """
+
+    def __init__(self, keyword_ratings: dict, author_ratings: dict, rate_abstract: bool = True):
+        keyword_matcher = KeywordMatcher(keyword_ratings)
+        author_matcher = AuthorMatcher(author_ratings)
+        object.__setattr__(self, "keyword_matcher", keyword_matcher)
+        object.__setattr__(self, "author_matcher", author_matcher)
+        object.__setattr__(self, "rate_abstract", bool(rate_abstract))
+        # normalized terms: lowercase keywords without duplicates, authors with a name
+        object.__setattr__(self, "keywords", tuple(zip(keyword_matcher.keywords, keyword_matcher.ratings)))
+        object.__setattr__(self, "authors", tuple(zip(author_matcher.authors, author_matcher.ratings)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return (f"{type(self).__name__}({len(self.keywords):d} keywords, {len(self.authors):d} authors, "
+                f"rate_abstract={self.rate_abstract!r})")
+
+    @classmethod
+    def from_config(cls, config) -> "RatingProfile":
+        """Compile ratings of config (`ignore_abstract` option included)"""
+        return cls(config.keywords, config.authors, not config["ignore_abstract"])
+
+    @property
+    def digest(self) -> str:
+        """Hash of the normalized ratings, equal for configs that rate the same way"""
+        return hashlib.sha256(repr((self.keywords, self.authors, self.rate_abstract)).encode()).hexdigest()
+
+    def evaluate(self, entry):
+        """Evaluate entry (see `Entry.evaluate`), returns its rating"""
+        return entry.evaluate(None, None, self.rate_abstract, self.keyword_matcher, self.author_matcher)
+
+
+# profiles loaded in this process, by cache file
+_loaded = {}
+
+def _file_hash(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_profile(config, cache_dir: Path = None) -> RatingProfile:
+    """Compiled profile of config, cached in memory and on disk
+
+    Profiles of configs read from a file (and not changed afterwards, see
+    `Config.path`) are pickled to `cache_dir`, keyed by the path of the
+    config file and whether abstracts are rated. A cached profile is reused
+    if modification time and size of the config file are unchanged, or
+    else if the hash of its content is. Other configs are compiled every
+    time.
+
+    Args:
+        config (Config): configuration to compile
+        cache_dir (:obj:`Path`, optional): directory for pickled profiles, no disk cache if None
+    """
+    rate_abstract = not config["ignore_abstract"]
+    if config.path is None:
+        return RatingProfile(config.keywords, config.authors, rate_abstract)
+
+    path = Path(config.path).resolve()
+    name = hashlib.sha256(f"{path}\n{rate_abstract}".encode()).hexdigest()[:32] + ".pickle"
+    stat = path.stat()
+    file_hash = None
+
+    cached = _loaded.get(name)
+    if cached is None and cache_dir is not None:
+        try:
+            with open(Path(cache_dir) / name, "rb") as f:
+                cached = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            cached = None
+        if cached is not None and cached.get("version") != __version__:
+            cached = None
+
+    if cached is not None:
+        if (cached["mtime"], cached["size"]) == (stat.st_mtime_ns, stat.st_size):
+            _loaded[name] = cached
+            return cached["profile"]
+        file_hash = _file_hash(path)
+        if cached["hash"] == file_hash:
+            logger.debug("Config file touched but unchanged, reusing compiled profile")
+            cached = dict(cached, mtime=stat.st_mtime_ns, size=stat.st_size)
+            _loaded[name] = cached
+            _write_cache(cache_dir, name, cached)
+            return cached["profile"]
+
+    logger.info("Compiling rating profile of '%s'", path)
+    cached = {
+        "version": __version__,
+        "path": str(path),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": file_hash or _file_hash(path),
+        "profile": RatingProfile(config.keywords, config.authors, rate_abstract),
+    }
+    _loaded[name] = cached
+    _write_cache(cache_dir, name, cached)
+    return cached["profile"]
+
+def _write_cache(cache_dir: Path, name: str, cached: dict):
+    if cache_dir is None:
+        return
+    cache_dir = Path(cache_dir)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temporary = cache_dir / f"{name:s}.{os.getpid():d}.tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cache_dir / name)
+    except OSError as err:
+        logger.warning(f"Could not cache rating profile: {err!r}")
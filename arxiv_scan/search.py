@@ -0,0 +1,399 @@
+"""Full-text search of the harvested records
+
+The records of the record store are indexed in an inverted index (SQLite
+file next to the store): every term points to the documents containing it,
+together with the positions of the term, for three fields:
+
+    text      words of title and abstract (default)
+    author    name tokens of the authors (`author:` or `au:`)
+    cat       categories of the record and their prefixes (`cat:`)
+
+Queries combine terms and "phrases" with AND (implicit), OR, NOT (or a
+leading `-`) and parentheses, e.g. `"hot jupiter" (author:alpher OR
+author:bethe) -cat:astro-ph:ga`. Matches are ranked with BM25.
+"""
+import math
+import re
+import unicodedata
+from array import array
+
+from .entry_evaluation import Entry
+from .matching import name_tokens
+from .store import StoreIndex
+
+
+TEXT, AUTHOR, CATEGORY = 0, 1, 2
+field_names = {"text": TEXT, "author": AUTHOR, "au": AUTHOR, "cat": CATEGORY, "category": CATEGORY}
+
+# BM25 parameters
+k1 = 1.2
+b = 0.75
+
+_schema = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    length INTEGER NOT NULL,
+    date_submitted REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    field INTEGER NOT NULL,
+    doc INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, field, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+CREATE TABLE IF NOT EXISTS positions (
+    term TEXT NOT NULL,
+    field INTEGER NOT NULL,
+    doc INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term, field, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS positions_doc ON positions (doc);
+"""
+
+_word = re.compile(r"\w+")
+
+def text_tokens(text: str) -> list:
+    """Split text into lowercase words without accents"""
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(
+            char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char)
+        )
+    return _word.findall(text)
+
+def category_terms(set_spec: str) -> set:
+    """Terms a category is found by
+
+    `physics:astro-ph:EP` is found by its prefixes `physics`,
+    `physics:astro-ph` and `physics:astro-ph:ep`, and without the group as
+    `astro-ph`, `astro-ph:ep` or `astro-ph.ep` (arXiv notation).
+    """
+    parts = set_spec.lower().split(":")
+    terms = {":".join(parts[:i]) for i in range(1, len(parts) + 1)}
+    for i in range(2, len(parts) + 1):
+        terms.add(":".join(parts[1:i]))
+        terms.add(".".join(parts[1:i]))
+    return terms
+
+def document_terms(entry: Entry, set_specs: list) -> tuple:
+    """Terms of an entry with their positions
+
+    Returns:
+        tuple: dict `(term, field)` to list of positions, and number of text tokens
+    """
+    terms = {}
+    # title and abstract (and authors) are separated by a position, so phrases do not span them
+    position = 0
+    for text in (entry.title, entry.abstract):
+        for token in text_tokens(text):
+            terms.setdefault((token, TEXT), []).append(position)
+            position += 1
+        position += 1
+    length = position
+    position = 0
+    for author in entry.authors:
+        for token in name_tokens(author):
+            terms.setdefault((token, AUTHOR), []).append(position)
+            position += 1
+        position += 1
+    for set_spec in {entry.category, *set_specs}:
+        for term in category_terms(set_spec):
+            terms.setdefault((term, CATEGORY), [0])
+    return terms, length
+
+
+_query_token = re.compile(r'\s*(?:(\()|(\))|(-)?(?:(\w+):)?(?:"([^"]*)"|([^\s()"]+)))')
+
+def parse_query(query: str):
+    """Parse query into a tree of nested tuples
+
+    Nodes are `("and", [nodes])`, `("or", [nodes])`, `("not", node)` and
+    `("phrase", field, [tokens])` (a single term is a phrase of one token).
+
+    Raises:
+        ValueError: for unbalanced parentheses, dangling operators or an empty query
+    """
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _query_token.match(query, position)
+        if match is None:
+            raise ValueError(f"Cannot parse query at '{query[position:]}'")
+        position = match.end()
+        opening, closing, negated, field, phrase, word = match.groups()
+        if opening or closing:
+            tokens.append(opening or closing)
+            continue
+        if field is not None and field.lower() not in field_names:
+            # colon is part of the word, e.g. `physics:astro-ph`
+            word = f"{field}:{word}" if word is not None else field
+            field = None
+        if phrase is None and field is None and word in ("AND", "OR", "NOT"):
+            tokens.append(word)
+            continue
+        field = field_names[field.lower()] if field else TEXT
+        text = phrase if phrase is not None else word
+        if field == CATEGORY:
+            terms = [text.lower()]
+        elif field == AUTHOR:
+            terms = list(name_tokens(text))
+        else:
+            terms = text_tokens(text)
+        if not terms:
+            continue
+        node = ("phrase", field, terms)
+        if negated:
+            tokens.append("NOT")
+        tokens.append(node)
+
+    def parse_or(i):
+        nodes = []
+        node, i = parse_and(i)
+        nodes.append(node)
+        while i < len(tokens) and tokens[i] == "OR":
+            node, i = parse_and(i + 1)
+            nodes.append(node)
+        return (nodes[0] if len(nodes) == 1 else ("or", nodes)), i
+
+    def parse_and(i):
+        nodes = []
+        while i < len(tokens) and tokens[i] not in ("OR", ")"):
+            if tokens[i] == "AND":
+                if not nodes:
+                    raise ValueError("Unexpected 'AND'")
+                i += 1
+                if i >= len(tokens):
+                    raise ValueError("Query ends with AND")
+                if tokens[i] in ("AND", "OR", ")"):
+                    raise ValueError(f"Unexpected '{tokens[i]}'")
+                continue
+            node, i = parse_not(i)
+            nodes.append(node)
+        if not nodes:
+            raise ValueError("Empty query (or part of query)")
+        return (nodes[0] if len(nodes) == 1 else ("and", nodes)), i
+
+    def parse_not(i):
+        if i >= len(tokens):
+            raise ValueError("Query ends with NOT")
+        if tokens[i] == "NOT":
+            node, i = parse_not(i + 1)
+            return ("not", node), i
+        if tokens[i] == "(":
+            node, i = parse_or(i + 1)
+            if i >= len(tokens) or tokens[i] != ")":
+                raise ValueError("Missing closing parenthesis")
+            return node, i + 1
+        if tokens[i] in ("AND", "OR", ")"):
+            raise ValueError(f"Unexpected '{tokens[i]}'")
+        return tokens[i], i + 1
+
+    if not tokens:
+        raise ValueError("Empty query")
+    tree, i = parse_or(0)
+    if i < len(tokens):
+        raise ValueError(f"Unexpected '{tokens[i]}'")
+    return tree
+
+
+class SearchIndex(StoreIndex):
+    """Persistent inverted index of the records in a record store
+
+    The index is kept up to date incrementally: `update` only indexes the
+    records written to the store since the last update.
+
+    Posting lists (documents and term frequencies) and term positions are
+    stored in separate tables, so boolean queries and ranking only read
+    the small posting rows, positions are only read to check phrases.
+
+    Args:
+        path (Path): location of the SQLite database file of the index
+    """
+
+    schema = _schema
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add(self, entries: list, watermark: int = None):
+        """Index `(entry, set_specs)` pairs, replacing earlier versions of the entries"""
+        with self._lock, self._db:
+            for entry, set_specs in entries:
+                terms, length = document_terms(entry, set_specs)
+                row = self._db.execute("SELECT doc FROM documents WHERE id = ?", (entry.id,)).fetchone()
+                if row is not None:
+                    self._db.execute("DELETE FROM postings WHERE doc = ?", row)
+                    self._db.execute("DELETE FROM positions WHERE doc = ?", row)
+                    doc = row[0]
+                    self._db.execute(
+                        "UPDATE documents SET length = ?, date_submitted = ? WHERE doc = ?",
+                        (length, entry.date_submitted.timestamp(), doc),
+                    )
+                else:
+                    doc = self._db.execute(
+                        "INSERT INTO documents (id, length, date_submitted) VALUES (?, ?, ?)",
+                        (entry.id, length, entry.date_submitted.timestamp()),
+                    ).lastrowid
+                self._db.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?, ?)",
+                    [(term, field, doc, len(positions)) for (term, field), positions in terms.items()],
+                )
+                self._db.executemany(
+                    "INSERT INTO positions VALUES (?, ?, ?, ?)",
+                    [(term, field, doc, array("I", positions).tobytes())
+                     for (term, field), positions in terms.items() if field != CATEGORY],
+                )
+            self._set_watermark(watermark)
+
+    def _postings(self, term: str, field: int, cache: dict) -> dict:
+        """doc to frequency of term in field"""
+        key = (term, field)
+        if key not in cache:
+            cache[key] = dict(self._db.execute(
+                "SELECT doc, tf FROM postings WHERE term = ? AND field = ?", key
+            ).fetchall())
+        return cache[key]
+
+    def _positions(self, term: str, field: int, docs: list) -> dict:
+        """doc to positions of term in field for the given docs"""
+        positions = {}
+        if len(docs) > 500:
+            # cheaper to read all positions of the term than to look up each doc
+            wanted = set(docs)
+            for doc, blob in self._db.execute(
+                "SELECT doc, positions FROM positions WHERE term = ? AND field = ?", (term, field)
+            ):
+                if doc in wanted:
+                    positions[doc] = array("I", blob)
+            return positions
+        for i in range(0, len(docs), 500):
+            chunk = docs[i:i + 500]
+            for doc, blob in self._db.execute(
+                "SELECT doc, positions FROM positions WHERE term = ? AND field = ? "
+                f"AND doc IN ({', '.join('?' * len(chunk))})",
+                (term, field, *chunk),
+            ):
+                positions[doc] = array("I", blob)
+        return positions
+
+    def _phrase(self, field: int, terms: list, cache: dict) -> set:
+        # rarest terms first, to narrow down the documents quickly
+        postings = sorted((self._postings(term, field, cache) for term in set(terms)), key=len)
+        docs = set(postings[0])
+        for other in postings[1:]:
+            docs &= other.keys()
+        if len(terms) == 1 or not docs:
+            return docs
+        # check positions of the candidates: all terms have to follow each other
+        docs = list(docs)
+        starts = {doc: None for doc in docs}
+        for offset, term in enumerate(terms):
+            for doc, positions in self._positions(term, field, docs).items():
+                shifted = {position - offset for position in positions}
+                starts[doc] = shifted if starts[doc] is None else starts[doc] & shifted
+            docs = [doc for doc in docs if starts[doc]]
+            if not docs:
+                break
+        return set(docs)
+
+    def _all_docs(self, cache: dict) -> set:
+        if "all" not in cache:
+            cache["all"] = {row[0] for row in self._db.execute("SELECT doc FROM documents")}
+        return cache["all"]
+
+    def _evaluate(self, node, cache: dict) -> set:
+        kind = node[0]
+        if kind == "phrase":
+            return self._phrase(node[1], node[2], cache)
+        if kind == "or":
+            return set().union(*(self._evaluate(child, cache) for child in node[1]))
+        if kind == "not":
+            return self._all_docs(cache) - self._evaluate(node[1], cache)
+        # and: intersect positive parts first, then remove negated parts
+        positive = [child for child in node[1] if child[0] != "not"]
+        negative = [child[1] for child in node[1] if child[0] == "not"]
+        docs = None
+        for child in positive:
+            docs = self._evaluate(child, cache) if docs is None else docs & self._evaluate(child, cache)
+            if not docs:
+                return set()
+        if docs is None:
+            docs = set(self._all_docs(cache))
+        for child in negative:
+            docs -= self._evaluate(child, cache)
+        return docs
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Find records matching query, best matches first
+
+        Text and author terms outside of NOT contribute to the BM25 score,
+        matches with the same score are ordered by date (newest first).
+
+        Returns:
+            list: `(arXiv id, score)` tuples
+
+        Raises:
+            ValueError: if the query cannot be parsed
+        """
+        tree = parse_query(query)
+        cache = {}
+        with self._lock:
+            docs = self._evaluate(tree, cache)
+            if not docs:
+                return []
+            n_docs, average_length = self._db.execute(
+                "SELECT COUNT(*), AVG(length) FROM documents"
+            ).fetchone()
+            info = {}
+            doc_list = list(docs)
+            for i in range(0, len(doc_list), 500):
+                chunk = doc_list[i:i + 500]
+                for doc, id, length, date in self._db.execute(
+                    "SELECT doc, id, length, date_submitted FROM documents "
+                    f"WHERE doc IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ):
+                    info[doc] = (id, length, date)
+
+            scores = dict.fromkeys(docs, 0.0)
+            for field, term in _scored_terms(tree):
+                if field == CATEGORY:
+                    continue
+                postings = self._postings(term, field, cache)
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                # author lists are short, only normalize the length of texts
+                norm_b = b if field == TEXT else 0
+                for doc in docs & postings.keys():
+                    tf = postings[doc]
+                    length_norm = 1 - norm_b + norm_b * info[doc][1] / (average_length or 1)
+                    scores[doc] += idf * tf * (k1 + 1) / (tf + k1 * length_norm)
+
+        ranked = sorted(docs, key=lambda doc: (-scores[doc], -info[doc][2]))
+        return [(info[doc][0], scores[doc]) for doc in ranked[:limit]]
+
+
+def _scored_terms(node) -> set:
+    """`(field, term)` pairs of the query, except negated ones"""
+    kind = node[0]
+    if kind == "phrase":
+        return {(node[1], term) for term in node[2]}
+    if kind == "not":
+        return set()
+    return set().union(*(_scored_terms(child) for child in node[1]))
+
+
+def highlight(entry: Entry, query: str):
+    """Mark title words and authors matching the (positive) terms of query"""
+    for field, term in _scored_terms(parse_query(query)):
+        if field == TEXT:
+            entry.mark_title_keyword(term)
+        elif field == AUTHOR:
+            for i, author in enumerate(entry.authors):
+                if term in name_tokens(author):
+                    entry.mark_author(i)
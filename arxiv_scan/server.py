@@ -0,0 +1,309 @@
+"""Long-running server keeping harvested entries in memory for fast rating
+
+`arxiv-scan serve` harvests the configured categories once, keeps the
+entries in memory and refreshes them after every arXiv announcement. Clients
+(`arxiv-scan --server URL`) send their keywords, authors and options and get
+the rated and ranked entries back, without harvesting anything themselves.
+
+API (JSON over HTTP):
+
+    GET  /status  served categories, window, number of entries and refresh times
+    POST /rate    {"keywords": {...}, "authors": {...}, "options": {...}}
+                  with the options of the config file, returns the ranked entries
+"""
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from . import __version__
+from .categories import load_categories
+from .config import Config
+from .entry_evaluation import EntryBatch, EntryRanker, entry_from_dict, entry_to_dict
+from .oai_api import OAIClient, default_client
+from .parse import iter_entries, keep_category, keep_dates, parse_date, submission_window_start
+from .rating import RatingProfile
+from .store import RecordStore
+
+
+logger = logging.getLogger(__name__)
+
+default_port = 8470
+# arXiv announces new submissions at 20:00 US eastern time, the OAI
+# interface is updated some time later
+refresh_delay = timedelta(minutes=30)
+# wait before retrying a failed refresh
+retry_delay = timedelta(minutes=15)
+# number of rating results kept (and recomputed after a refresh)
+results_cache_size = 32
+
+
+def next_refresh(now: datetime) -> datetime:
+    """Time to refresh after the next arXiv announcement following `now`"""
+    local = now.astimezone(submission_window_start(now).tzinfo)
+    for days in range(8):
+        announcement = (local + timedelta(days=days)).replace(hour=20, minute=0, second=0, microsecond=0)
+        # no announcement if the submission window doesn't change (Friday, Saturday)
+        if submission_window_start(announcement) == submission_window_start(announcement - timedelta(minutes=1)):
+            continue
+        # the refresh of an announcement is due until `refresh_delay` after it
+        if announcement + refresh_delay > local:
+            return announcement + refresh_delay
+    return local + timedelta(days=1)
+
+
+@lru_cache(maxsize=64)
+def _profile(keyword_items: tuple, author_items: tuple, rate_abstract: bool) -> RatingProfile:
+    """Compiled profile, cached for clients sending the same ratings again"""
+    return RatingProfile(dict(keyword_items), dict(author_items), rate_abstract)
+
+class EntryPool:
+    """Harvested entries of a set of categories, rated on request
+
+    The pool holds all entries of the categories since the start of
+    `window` (see `parse.parse_date`), including cross-lists and
+    resubmissions, so every query can filter them according to its own
+    options. Categories not served yet are harvested on the first request
+    for them. Refreshing replaces the entries at once, requests are
+    answered from the previous entries meanwhile.
+
+    Args:
+        categories (list): arXiv subjects to harvest
+        window (:obj:`str`, optional): `date` option of the earliest entries to serve (default: "recent")
+        store (:obj:`RecordStore`, optional): Local record store for incremental harvesting
+        client (:obj:`OAIClient`, optional): Client for the OAI API (default: `oai_api.default_client()`)
+        catalogue_path (:obj:`Path`, optional): Cached category catalogue to check requested categories
+    """
+
+    def __init__(self, categories: list, window="recent", store: RecordStore = None,
+                 client: OAIClient = None, catalogue_path: Path = None):
+        self.categories = list(categories)
+        self.window = window
+        self.store = store
+        self.client = client if client is not None else default_client()
+        self.catalogue_path = catalogue_path
+        # (generation, EntryBatch, cutoff_date, harvest start), replaced at once by `refresh`
+        self._snapshot = (0, EntryBatch(), None, None)
+        self._refresh_lock = threading.Lock()
+        self._results_lock = threading.Lock()
+        self._results = OrderedDict()
+
+    def refresh(self, categories: list = ()):
+        """Harvest all served categories (and the given new ones) again"""
+        with self._refresh_lock:
+            new_categories = [c for c in categories if c not in self.categories]
+            if categories and not new_categories:
+                # added by a concurrent request meanwhile
+                return
+            categories = self.categories + new_categories
+            cutoff_date = parse_date(self.window)
+            started = datetime.now(timezone.utc)
+            # kept in columns until the next refresh, `matched_categories` are complete after the harvest
+            entries = EntryBatch(list(iter_entries(
+                categories, cutoff_date=cutoff_date, cross_lists=True, resubmissions=True,
+                store=self.store, client=self.client,
+            )))
+            self.categories = categories
+            self._snapshot = (self._snapshot[0] + 1, entries, cutoff_date, started)
+            logger.info(f"Harvested {len(entries):d} entries of {', '.join(categories):s}")
+            queries = self._cached_queries()
+        # rate the latest queries again, so their clients get fast answers after the announcement
+        for query in queries:
+            try:
+                self.rate(query)
+            except ValueError:
+                pass
+
+    def _cached_queries(self) -> list:
+        with self._results_lock:
+            return [json.loads(key) for key in self._results]
+
+    def status(self) -> dict:
+        """Served categories, window and refresh time"""
+        generation, entries, cutoff_date, harvested = self._snapshot
+        return {
+            "version": __version__,
+            "categories": self.categories,
+            "generation": generation,
+            "cutoff_date": cutoff_date.isoformat() if cutoff_date else None,
+            "harvested": harvested.isoformat() if harvested else None,
+            "entries": len(entries),
+        }
+
+    def _check_categories(self, categories: list):
+        known = set(load_categories(self.catalogue_path, client=self.client))
+        if self.catalogue_path is not None and not known.issuperset(categories):
+            # categories might be new since the catalogue was cached
+            known = set(load_categories(self.catalogue_path, ttl=0, client=self.client))
+        not_found = [category for category in categories if category not in known]
+        if not_found:
+            raise ValueError(f"Category not found: {', '.join(not_found):s}")
+
+    def rate(self, query: dict) -> dict:
+        """Rate and rank the entries for keywords, authors and options of query
+
+        Raises:
+            ValueError: for invalid options, unknown categories or a date before the served window
+        """
+        key = json.dumps(query, sort_keys=True)
+        with self._results_lock:
+            cached = self._results.get(key)
+            if cached is not None and cached["generation"] == self._snapshot[0]:
+                self._results.move_to_end(key)
+                return cached
+
+        config = Config()
+        for keyword, rating in query.get("keywords", {}).items():
+            config.add_keyword(keyword, rating)
+        for author, rating in query.get("authors", {}).items():
+            config.add_author(author, rating)
+        for option, value in query.get("options", {}).items():
+            config[option] = value
+
+        categories = [category.strip() for category in config["categories"].split(",")]
+        new_categories = [category for category in categories if category not in self.categories]
+        if new_categories:
+            self._check_categories(new_categories)
+            self.refresh(new_categories)
+
+        generation, entries, window_start, harvested = self._snapshot
+        cutoff_date = parse_date(config["date"])
+        if cutoff_date < window_start:
+            raise ValueError(f"Date {cutoff_date} is before the served window starting {window_start}")
+
+        profile = _profile(
+            tuple(config.keywords.items()), tuple(config.authors.items()), not config["ignore_abstract"]
+        )
+        ranker = EntryRanker(config["minimum_rating"], config["reverse_list"], config["length"])
+        for entry in entries:
+            if not keep_dates((entry.date_submitted, entry.date_updated), cutoff_date, config["resubmissions"]):
+                continue
+            if not any(keep_category(entry.category, category, config["show_cross_lists"])
+                       for category in entry.matched_categories if category in categories):
+                continue
+            # entries of the batch are created on the fly, evaluating them leaves the batch unchanged
+            profile.evaluate(entry)
+            ranker.add(entry)
+
+        result = {
+            "generation": generation,
+            "harvested": harvested.isoformat(),
+            "cutoff_date": cutoff_date.isoformat(),
+            "entries": [entry_to_dict(entry) for entry in ranker.results()],
+        }
+        with self._results_lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > results_cache_size:
+                self._results.popitem(last=False)
+        return result
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = f"arxiv-scan/{__version__}"
+
+    def _reply(self, status: int, data: dict):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/status":
+            status = self.server.pool.status()
+            status["next_refresh"] = self.server.next_refresh.isoformat()
+            self._reply(200, status)
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/rate":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            query = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            self._reply(200, self.server.pool.rate(query))
+        except ValueError as err:
+            self._reply(400, {"error": str(err)})
+        except Exception as err:
+            logger.exception("Error while rating entries")
+            self._reply(500, {"error": repr(err)})
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.client_address[0]:s} {format % args:s}")
+
+
+class ScanServer(ThreadingHTTPServer):
+    """HTTP server answering rating requests from an `EntryPool`
+
+    A background thread refreshes the pool after every arXiv announcement
+    (see `next_refresh`).
+
+    Args:
+        address (tuple): `(host, port)` to listen on
+        pool (EntryPool): entries to serve, harvested on `serve_forever` if not done before
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, pool: EntryPool):
+        super().__init__(address, _RequestHandler)
+        self.pool = pool
+        self.next_refresh = None
+        self._stop = threading.Event()
+
+    def _refresh_loop(self):
+        while True:
+            delay = (self.next_refresh - datetime.now(timezone.utc)).total_seconds()
+            if self._stop.wait(max(delay, 0)):
+                return
+            try:
+                self.pool.refresh()
+                self.next_refresh = next_refresh(datetime.now(timezone.utc))
+            except Exception as err:
+                logger.error(f"Refresh failed, retrying in {retry_delay}: {err!r}")
+                self.next_refresh = datetime.now(timezone.utc) + retry_delay
+
+    def serve_forever(self, poll_interval: float = 0.5):
+        """Harvest the pool (unless done already), then answer requests until `shutdown()`"""
+        if self.pool.status()["harvested"] is None:
+            self.pool.refresh()
+        self.next_refresh = next_refresh(datetime.now(timezone.utc))
+        refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+        refresher.start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._stop.set()
+
+
+def query_server(url: str, config: Config, timeout: float = 60) -> list:
+    """Rate entries with the keywords, authors and options of config on an arxiv-scan server
+
+    Returns:
+        list: ranked list of evaluated entries
+
+    Raises:
+        ValueError: if the server rejects the request (e.g. unknown category)
+    """
+    query = {"keywords": config.keywords, "authors": config.authors, "options": config.options}
+    request = urllib.request.Request(
+        url.rstrip("/") + "/rate", data=json.dumps(query).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.load(response)
+    except urllib.error.HTTPError as err:
+        if err.code == 400:
+            raise ValueError(json.load(err)["error"]) from None
+        raise
+    return [entry_from_dict(data) for data in result["entries"]]
@@ -0,0 +1,150 @@
+"""Timing and resource statistics of a run"""
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def max_rss() -> int:
+    """Peak resident memory of the process in bytes (None if unknown)"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on MacOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Counters:
+    """Named counters, safe to increment from several threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def add(self, name: str, n: int = 1):
+        """Increment counter by n"""
+        with self._lock:
+            self._counts[name] += n
+
+    def __getitem__(self, name: str) -> int:
+        with self._lock:
+            return self._counts[name]
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+class RunStats:
+    """Wall time, CPU time and peak memory per stage of a run
+
+    Stages are measured with the `stage` context manager (or `timed` for
+    iterators). Time is only charged to the innermost active stage, so
+    nested stages (e.g. harvesting inside the rating loop of streamed
+    entries) are not counted twice. A stage entered several times
+    accumulates its times. CPU time is the CPU time of the whole process,
+    including background threads. Stages must be entered from one thread.
+
+    Counters (requests, bytes, records, ...) are kept in `counters`.
+
+    Args:
+        enabled (:obj:`bool`, optional): measure stages, otherwise `stage` and
+            `timed` do nothing (default: True)
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stages = {}
+        self.counters = Counters()
+        self._stack = []
+
+    def _charge(self, name: str, wall: float, cpu: float):
+        stage = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0, "max_rss": None})
+        stage["wall"] += wall
+        stage["cpu"] += cpu
+
+    def stage(self, name: str):
+        """Measure the enclosed block as (part of) stage `name`"""
+        if not self.enabled:
+            return nullcontext()
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self._stack:
+            parent = self._stack[-1]
+            self._charge(parent[0], wall - parent[1], cpu - parent[2])
+        self._stack.append([name, wall, cpu])
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter(), time.process_time()
+            current = self._stack.pop()
+            self._charge(name, wall - current[1], cpu - current[2])
+            self.stages[name]["max_rss"] = max_rss()
+            if self._stack:
+                # continue measuring the parent stage
+                self._stack[-1][1:] = [wall, cpu]
+
+    def timed(self, iterable, name: str):
+        """Iterate over iterable, charging the time to produce each item to stage `name`"""
+        if not self.enabled:
+            return iter(iterable)
+        return self._timed(iterable, name)
+
+    def _timed(self, iterable, name: str):
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_dict(self) -> dict:
+        """Stages, counters and derived rates"""
+        counters = self.counters.as_dict()
+        rates = {}
+        harvest = self.stages.get("harvest", {}).get("wall")
+        if harvest:
+            rates["records_per_second"] = counters.get("records_parsed", 0) / harvest
+            rates["bytes_per_second"] = counters.get("http_bytes", 0) / harvest
+        evaluate = self.stages.get("evaluate", {}).get("wall")
+        if evaluate:
+            rates["entries_evaluated_per_second"] = counters.get("entries", 0) / evaluate
+        return {
+            "stages": self.stages,
+            "total": {
+                "wall": sum(stage["wall"] for stage in self.stages.values()),
+                "cpu": sum(stage["cpu"] for stage in self.stages.values()),
+                "max_rss": max_rss(),
+            },
+            "counters": counters,
+            "rates": rates,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def summary(self) -> str:
+        """Human readable table of stages and counters"""
+        data = self.as_dict()
+        lines = ["{:12s} {:>9s} {:>9s} {:>10s}".format("stage", "wall [s]", "cpu [s]", "rss [MB]")]
+        for name, stage in list(data["stages"].items()) + [("total", data["total"])]:
+            rss = "{:10.1f}".format(stage["max_rss"] / 2**20) if stage["max_rss"] else "{:>10s}".format("-")
+            lines.append("{:12s} {:9.3f} {:9.3f} {:s}".format(name, stage["wall"], stage["cpu"], rss))
+        lines.append("")
+        for name, value in sorted(data["counters"].items()):
+            lines.append("{:28s} {:>12d}".format(name, value))
+        for name, value in sorted(data["rates"].items()):
+            lines.append("{:28s} {:>12.1f}".format(name, value))
+        return "\n".join(lines)
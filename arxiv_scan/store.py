@@ -0,0 +1,277 @@
+"""Local on-disk store of harvested arXiv records"""
+import abc
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .entry_evaluation import Entry
+
+
+logger = logging.getLogger(__name__)
+
+_schema = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    datestamp TEXT NOT NULL,
+    title TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    abstract TEXT NOT NULL,
+    category TEXT NOT NULL,
+    date_submitted REAL NOT NULL,
+    date_updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    set_spec TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (set_spec, id)
+);
+CREATE TABLE IF NOT EXISTS harvests (
+    set_spec TEXT PRIMARY KEY,
+    date_from TEXT NOT NULL,
+    watermark TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_datestamp ON records (datestamp);
+"""
+
+
+def _timestamp(date: datetime) -> float:
+    return date.timestamp()
+
+def _datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+def _row2entry(row: tuple) -> Entry:
+    """Convert `(id, title, authors, abstract, category, date_submitted, date_updated)` row to Entry"""
+    id, title, authors, abstract, category, submitted, updated = row
+    return Entry(
+        id=id,
+        title=title,
+        authors=authors.split("\n"),
+        abstract=abstract,
+        category=category,
+        date_submitted=_datetime(submitted),
+        date_updated=_datetime(updated),
+    )
+
+
+class RecordStore:
+    """SQLite backed store of arXiv records, keyed by arXiv id
+
+    Besides the records themselves, the store remembers for every OAI set
+    (category) which datestamp window has been harvested completely. The
+    window starts at `date_from` and ends at the `watermark`, the (UTC) date
+    the last successful harvest started. Harvests only have to ask the server
+    for records with a datestamp since the watermark, the rest of the window
+    can be served from disk.
+
+    The store can be shared between threads, all access is serialized.
+
+    Args:
+        path (Path): location of the SQLite database file
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.executescript(_schema)
+
+    def close(self):
+        """Close database connection"""
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def coverage(self, set_spec: str) -> tuple:
+        """Harvested window `(date_from, watermark)` of set, or None if never harvested"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT date_from, watermark FROM harvests WHERE set_spec = ?", (set_spec,)
+            ).fetchone()
+
+    def set_coverage(self, set_spec: str, date_from: str, watermark: str):
+        """Record that all records of set from `date_from` up to `watermark` are stored"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO harvests (set_spec, date_from, watermark) VALUES (?, ?, ?)",
+                (set_spec, date_from, watermark),
+            )
+
+    def add(self, entries: list, set_spec: str):
+        """Insert or update `(entry, datestamp)` pairs harvested from set"""
+        self.add_records([
+            (entry.id, datestamp, entry.title, entry.authors, entry.abstract, entry.category,
+             entry.date_submitted, entry.date_updated)
+            for entry, datestamp in entries
+        ], set_spec)
+
+    def add_records(self, records: list, set_spec: str):
+        """Insert or update records harvested from set, without building entries
+
+        Args:
+            records (list): `(id, datestamp, title, authors, abstract, category,
+                     date_submitted, date_updated)` tuples, authors as list
+            set_spec (str): OAI set the records were harvested from
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (id, datestamp, title, "\n".join(authors), abstract, category,
+                     _timestamp(submitted), _timestamp(updated))
+                    for id, datestamp, title, authors, abstract, category, submitted, updated in records
+                ],
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO memberships VALUES (?, ?)",
+                [(set_spec, record[0]) for record in records],
+            )
+
+    def entries(self, set_spec: str, date_from: str, keep=None):
+        """Iterate over stored entries of set with a datestamp since `date_from`
+
+        Args:
+            set_spec (str): OAI set the records were harvested from
+            date_from (str): earliest datestamp (`YYYY-MM-DD`)
+            keep (:obj:`callable`, optional): filter called with primary category and
+                 `(date_submitted, date_updated)` of a record before its entry is built
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT r.id, r.title, r.authors, r.abstract, r.category, r.date_submitted, r.date_updated "
+                "FROM records r JOIN memberships m ON r.id = m.id "
+                "WHERE m.set_spec = ? AND r.datestamp >= ? ORDER BY r.datestamp, r.id",
+                (set_spec, date_from),
+            ).fetchall()
+        for row in rows:
+            if keep is None or keep(row[4], (_datetime(row[5]), _datetime(row[6]))):
+                yield _row2entry(row)
+
+    def entries_by_id(self, ids: list) -> dict:
+        """Get stored entries with the given arXiv ids as dict id to Entry"""
+        ids = list(ids)
+        rows = []
+        with self._lock:
+            # stay below SQLite's limit of variables per statement
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows.extend(self._db.execute(
+                    "SELECT id, title, authors, abstract, category, date_submitted, date_updated "
+                    f"FROM records WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall())
+        return {row[0]: _row2entry(row) for row in rows}
+
+    def changed_since(self, rowid: int, batch_size: int = 1000):
+        """Iterate over records stored (or updated) after `rowid`
+
+        Records get a new rowid whenever they are written, so this gives all
+        changes since a previous call, e.g. for updating an index. Records
+        are read from the database in batches.
+
+        Yields:
+            tuple: `(rowid, entry, set_specs)` in order of rowid
+        """
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT rowid, id, title, authors, abstract, category, date_submitted, date_updated "
+                    "FROM records WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (rowid, batch_size),
+                ).fetchall()
+                memberships = {}
+                if rows:
+                    for set_spec, id in self._db.execute(
+                        "SELECT m.set_spec, m.id FROM memberships m JOIN records r ON r.id = m.id "
+                        "WHERE r.rowid > ? AND r.rowid <= ?",
+                        (rowid, rows[-1][0]),
+                    ):
+                        memberships.setdefault(id, []).append(set_spec)
+            if not rows:
+                return
+            for row in rows:
+                yield row[0], _row2entry(row[1:]), memberships.get(row[1], [])
+            rowid = rows[-1][0]
+
+
+class StoreIndex(abc.ABC):
+    """Base of SQLite files derived from a record store and updated incrementally
+
+    `update` reads the records written to the store since the last update
+    (see `RecordStore.changed_since`) and passes them to `add` in batches,
+    together with the rowid of the last record of the batch, which is kept
+    as watermark in the `meta` table.
+
+    Subclasses define their tables in `schema`, turn records into the
+    documents passed to `add` with `document`, and store the watermark in
+    `add` with `_set_watermark` (in the same transaction as the documents).
+
+    Args:
+        path (Path): location of the SQLite database file
+    """
+
+    schema = ""
+    # number of records added at once
+    batch_size = 1000
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.executescript(self.schema + "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);")
+
+    def close(self):
+        """Close database connection"""
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def watermark(self) -> int:
+        """Rowid of the last record of the store that has been added"""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        return row[0] if row else 0
+
+    def _set_watermark(self, watermark: int):
+        if watermark is not None:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)", (watermark,))
+
+    def update(self, store: RecordStore) -> int:
+        """Add the records written to store since the last update
+
+        Returns:
+            int: number of added (or replaced) records
+        """
+        n = 0
+        batch = []
+        for rowid, entry, set_specs in store.changed_since(self.watermark):
+            batch.append(self.document(entry, set_specs))
+            if len(batch) >= self.batch_size:
+                self.add(batch, rowid)
+                n += len(batch)
+                batch = []
+        if batch:
+            self.add(batch, rowid)
+            n += len(batch)
+        return n
+
+    def document(self, entry: Entry, set_specs: list):
+        """Document passed to `add` for a stored record (default: `(entry, set_specs)`)"""
+        return entry, set_specs
+
+    @abc.abstractmethod
+    def add(self, documents: list, watermark: int = None):
+        """Add documents, replacing earlier versions of them, and set the watermark"""
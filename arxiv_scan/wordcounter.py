@@ -1,32 +1,160 @@
 import json
 import os.path
 from collections import Counter
-from re import findall
+import re
 import argparse
 from pathlib import Path
 
-from .config import Config, find_configfile, configfile_default_location
+from .config import Config, cachedir_default_location, find_configfile, configfile_default_location
 
 
-def _count_words(fname):
-    with open(fname) as f:
-        text = f.read()
-    words = findall(r'\b\w{4,12}\b', text.lower())
-    return Counter(words)
+# size of the blocks read from files, bounds the memory used per worker
+chunk_size = 1 << 20
+# files are split into parts of about this size, counted in parallel
+part_size = 16 << 20
+# suffixes of files counted when scanning directories
+text_suffixes = (".tex", ".bib", ".bbl", ".txt", ".md", ".rst")
 
+# frequent words of 4-12 characters without meaning as a keyword
+stop_words = frozenset("""
+    about above according after again against almost along already also although always among
+    another anything around based because been before being below between both cannot could
+    different does doing done down during each either enough especially even every example
+    fact figure first following found from further given good have having here however include
+    including into itself just large less like made make many might more most much must near
+    need never next note number often once only other others otherwise over paper perhaps
+    possible present previous rather really respectively result results same section several
+    shall should show shown shows similar since small some such than that their them themselves
+    then there therefore these they thing this those though through thus together under until
+    upon used using very well were what whatever when where whereas whether which while whom
+    whose will with within without would your
+""".split())
 
-def most_common_words_in_file(fname, n, verbose=False):
-    counts = _count_words(fname)
+# field names of bibtex entries
+bibtex_fields = frozenset("""
+    abstract address adsnote adsurl archiveprefix article author booktitle chapter doi edition
+    editor eprint howpublished inproceedings institution journal keywords misc month note
+    number organization pages primaryclass publisher school series title type volume year
+""".split())
+
+# LaTeX commands (with the arguments of commands not containing text) and words to count
+_tokens = re.compile(
+    r"\\(?:begin|end|label|ref|eqref|autoref|cref|cite[a-z]*|usepackage|documentclass|"
+    r"includegraphics|bibliographystyle|bibliography|input|include|url|href)\*?(?:\[[^\]]*\])*\{[^}]*\}"
+    r"|\\[a-z@]+"
+    r"|\b(\w{4,12})\b"
+)
+
+
+def words(text: str) -> list:
+    """Lowercase words with 4-12 characters in text, without LaTeX commands"""
+    return [word for word in _tokens.findall(text.lower()) if word]
+
+def _count_text(text: str, counts: Counter):
+    counts.update(_tokens.findall(text.lower()))
+
+def _count_part(part: tuple) -> Counter:
+    """Count words in the bytes `start` to `end` of a file, reading them in chunks"""
+    fname, start, end = part
+    counts = Counter()
+    rest = b""
+    with open(fname, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            chunk = rest + chunk
+            # keep the last (maybe incomplete) line for the next chunk
+            cut = chunk.rfind(b"\n") + 1
+            if not cut:
+                cut = max(chunk.rfind(b" "), chunk.rfind(b"\t")) + 1
+            if cut and remaining > 0:
+                chunk, rest = chunk[:cut], chunk[cut:]
+            else:
+                rest = b""
+            _count_text(chunk.decode("utf-8", errors="replace"), counts)
+    _count_text(rest.decode("utf-8", errors="replace"), counts)
+    del counts[""]
+    return counts
+
+def _split(fname: Path) -> list:
+    """Split file into `(fname, start, end)` parts of about `part_size` bytes at line breaks"""
+    size = os.path.getsize(fname)
+    offsets = [0]
+    with open(fname, "rb") as f:
+        while offsets[-1] + part_size < size:
+            f.seek(offsets[-1] + part_size)
+            f.readline()
+            offsets.append(f.tell())
+    if offsets[-1] < size or size == 0:
+        offsets.append(size)
+    return [(fname, start, end) for start, end in zip(offsets, offsets[1:])]
+
+def find_text_files(paths: list) -> list:
+    """Files given in paths, and all files with `text_suffixes` in directories given (recursively)"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() in text_suffixes and p.is_file()))
+        else:
+            files.append(path)
+    return files
+
+def count_words(paths: list, workers: int = 1, exclude: frozenset = stop_words | bibtex_fields) -> Counter:
+    """Count words with 4-12 characters in files and directories
+
+    LaTeX commands (and the labels, references, citations etc. they
+    contain) are not counted. Files are read in chunks, large files are
+    split in parts, and with `workers > 1` the parts are counted in
+    parallel by worker processes.
+
+    Args:
+        paths (list): files and directories (see `find_text_files`) to scan
+        workers (:obj:`int`, optional): Number of worker processes
+        exclude (:obj:`frozenset`, optional): Words not counted (default: stop words and bibtex fields)
+
+    Returns:
+        Counter: number of occurrences of every (lowercase) word
+    """
+    parts = [part for fname in find_text_files(paths) for part in _split(fname)]
+    counts = Counter()
+    if workers > 1 and len(parts) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(parts))) as executor:
+            for part_counts in executor.map(_count_part, parts):
+                counts.update(part_counts)
+    else:
+        for part in parts:
+            counts.update(_count_part(part))
+    for word in exclude:
+        counts.pop(word, None)
+    return counts
+
+
+def most_common_words_in_file(fname, n, verbose=False, workers=1, exclude=stop_words | bibtex_fields):
+    """Count words in file (or list of files and directories), print the `n` most common with `verbose`"""
+    paths = [fname] if isinstance(fname, (str, os.PathLike)) else fname
+    counts = count_words(paths, workers, exclude)
     if verbose:
         for word, count in [['WORD', 'COUNT']] + counts.most_common(n):
             print(f'{word:>10} {count:>6}')
     return counts
 
 
-def select_keywords(config: Config, counts):
-    """Let the user rate or reject keywords"""
-    # sort list by decreasing number of occurrence
-    counts = dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+def select_keywords(config: Config, counts, scores: dict = None):
+    """Let the user rate or reject keywords
+
+    Keywords are suggested by decreasing score if `scores` are given (e.g.
+    from `docfreq.tfidf`), else by decreasing number of occurrence.
+    """
+    if scores is not None:
+        counts = dict(sorted(counts.items(), key=lambda item: (scores.get(item[0], 0), item[1]), reverse=True))
+    else:
+        # sort list by decreasing number of occurrence
+        counts = dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
 
     print('for each suggested keyword, give a rating from 1 to 5 or reject it by pressing "enter".\nConclude by pressing "C".')
 
@@ -56,12 +184,56 @@ def select_keywords(config: Config, counts):
     return config
 
 
+def field_scores(config: Config, counts) -> dict:
+    """TF-IDF scores of words against the harvested records of the configured categories
+
+    Updates the document frequency table (see `docfreq`) from the record
+    store in the cache directory first. Returns None if no records of the
+    categories have been harvested.
+    """
+    from .docfreq import DocumentFrequencies, tfidf
+    from .store import RecordStore
+
+    categories = [category.strip() for category in config["categories"].split(",")]
+    cachedir = cachedir_default_location()
+    if not (cachedir / "records.sqlite").is_file():
+        print("No harvested records found to rank keywords, suggesting the most frequent words first.")
+        print("Run arxiv-scan (without --no-store) to harvest records.")
+        return None
+    with RecordStore(cachedir / "records.sqlite") as store, \
+            DocumentFrequencies(cachedir / "docfreq.sqlite") as frequencies:
+        frequencies.update(store)
+        documents = frequencies.documents(categories)
+        if not documents:
+            print(f"No harvested records of {', '.join(categories)} found to rank keywords, "
+                  "suggesting the most frequent words first.")
+            return None
+        print(f"Ranking keywords against {documents} harvested records of {', '.join(categories)}")
+        return tfidf(counts, frequencies.frequencies(categories), documents)
+
+
 def main():
     parser = argparse.ArgumentParser("Extract keywords from arbitrary text files")
     parser.add_argument("-c", "--config", help="Config file to write keywords to")
-    parser.add_argument("file", help="Text file to scan for keywords")
+    parser.add_argument("paths", nargs="+", metavar="path",
+                        help="Text files or directories (searched for {}) to scan for keywords".format(
+                            ", ".join(text_suffixes)))
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of processes counting words (default: number of CPUs)")
+    parser.add_argument("--stop-words", metavar="FILE",
+                        help="File with additional words to ignore, one per line")
+    parser.add_argument("--keep-stop-words", action="store_true",
+                        help="Count stop words and bibtex field names as well")
+    parser.add_argument("--by-frequency", action="store_true",
+                        help="Suggest the most frequent words first, instead of ranking them by TF-IDF "
+                        "against the harvested abstracts of the configured categories")
     args = parser.parse_args()
 
+    exclude = frozenset() if args.keep_stop_words else stop_words | bibtex_fields
+    if args.stop_words:
+        with open(args.stop_words) as f:
+            exclude |= frozenset(line.strip().lower() for line in f if line.strip())
+
     config = Config()
 
     if args.config:
@@ -76,8 +248,9 @@ def main():
     except FileNotFoundError:
         pass
 
-    counts = most_common_words_in_file(args.file, 200)
-    select_keywords(config, counts)
+    counts = most_common_words_in_file(args.paths, 200, workers=args.jobs, exclude=exclude)
+    scores = None if args.by_frequency else field_scores(config, counts)
+    select_keywords(config, counts, scores)
 
     print("Writing config back to {}".format(configfile))
     config.write(configfile, overwrite=True)
@@ -0,0 +1,120 @@
+"""Local stand-in for the arXiv OAI-PMH interface, serving synthetic records"""
+import gzip
+import http.server
+import random
+import threading
+import urllib.parse
+
+from synthetic import SyntheticArchive, list_records_page, list_sets_page
+
+
+class StandInServer:
+    """OAI-PMH server on localhost answering ListSets and ListRecords
+
+    Records come from a `SyntheticArchive`. ListRecords responses are split
+    into pages with resumption tokens in the format arXiv uses. Responses
+    are gzip compressed if requested, connections are kept alive.
+
+    Args:
+        archive (SyntheticArchive): records to serve
+        page_size (int): records per ListRecords page
+        unavailable_fraction (float): fraction of requests answered with 503
+        retry_after (int): Retry-After header of 503 responses in seconds
+        seed (int): random seed for 503 responses
+    """
+
+    def __init__(self, archive: SyntheticArchive, page_size: int = 1000,
+                 unavailable_fraction: float = 0.0, retry_after: int = 0, seed: int = 0):
+        self.archive = archive
+        self.page_size = page_size
+        self.unavailable_fraction = unavailable_fraction
+        self.retry_after = retry_after
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # pre-render all pages, so the server is not the bottleneck
+        self._pages = {
+            set_spec: self._render(set_spec) for set_spec in archive.set_specs
+        }
+        self._sets = list_sets_page(archive.set_specs)
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, headers, body = server.respond(self.path, self.headers)
+                if body and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body, compresslevel=1)
+                    headers["Content-Encoding"] = "gzip"
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _render(self, set_spec: str) -> list:
+        pages = self.archive.pages(set_spec, self.page_size)
+        total = len(self.archive.records[set_spec])
+        rendered = []
+        for number, records in enumerate(pages):
+            token = None
+            if number + 1 < len(pages):
+                token = "verb=ListRecords&resumptionToken={:s}|{:d}&skip=0".format(
+                    urllib.parse.quote(set_spec, safe=""), number + 1
+                )
+            rendered.append(list_records_page(records, token, number * self.page_size, total))
+        return rendered
+
+    @property
+    def url(self) -> str:
+        """Base URL of the OAI endpoint"""
+        return "http://127.0.0.1:{:d}/oai2".format(self._server.server_address[1])
+
+    def respond(self, path: str, headers) -> tuple:
+        """Status, headers and body for request path"""
+        with self._lock:
+            self.requests += 1
+            unavailable = self._rng.random() < self.unavailable_fraction
+        if unavailable:
+            return 503, {"Retry-After": str(self.retry_after)}, b""
+
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+        verb = query.get("verb", [""])[0]
+        if verb == "ListSets":
+            return 200, {"Content-Type": "text/xml"}, self._sets
+        if verb != "ListRecords":
+            return 400, {}, b""
+        if "resumptionToken" in query:
+            set_spec, number = query["resumptionToken"][0].rsplit("|", 1)
+            return 200, {"Content-Type": "text/xml"}, self._pages[set_spec][int(number)]
+        set_spec = query.get("set", [""])[0]
+        if set_spec not in self._pages:
+            return 200, {"Content-Type": "text/xml"}, list_records_page([])
+        return 200, {"Content-Type": "text/xml"}, self._pages[set_spec][0]
+
+    def start(self) -> "StandInServer":
+        """Serve requests in background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut down server"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,252 @@
+"""Benchmarks of the arxiv-scan pipeline
+
+Harvests synthetic arXivRaw records from a local stand-in OAI-PMH server
+and measures the throughput of the individual stages. Results are written
+as JSON, so runs of different versions can be compared:
+
+    python benchmarks/run.py --output new.json
+    python benchmarks/run.py --output new.json --compare old.json
+
+Use `--quick` for a small configuration (e.g. to check that the benchmarks
+still run).
+"""
+import argparse
+import io
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from xml.etree import ElementTree
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from oai_server import StandInServer  # noqa: E402
+from synthetic import SyntheticArchive, list_records_page, make_record, surnames, vocabulary  # noqa: E402
+
+import arxiv_scan  # noqa: E402
+from arxiv_scan.entry_evaluation import evaluate_entries, sort_entries  # noqa: E402
+from arxiv_scan.oai_api import OAIClient, RateLimiter, namespaces  # noqa: E402
+from arxiv_scan.output import print_entries  # noqa: E402
+from arxiv_scan.parse import get_entries, iter_records, xml2entry  # noqa: E402
+from arxiv_scan.store import RecordStore  # noqa: E402
+
+
+cutoff_date = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def timed(function, repeat: int = 3) -> float:
+    """Best wall time of `repeat` calls of function"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def keyword_ratings(n: int, rng: random.Random) -> dict:
+    words = list(vocabulary) + ["{:s}{:d}".format(rng.choice(vocabulary), i) for i in range(n)]
+    return {word: rng.randint(1, 5) for word in words[:n]}
+
+def author_ratings(n: int, rng: random.Random) -> dict:
+    names = list(surnames) + ["Author{:d}".format(i) for i in range(n)]
+    return {name: rng.randint(1, 5) for name in names[:n]}
+
+
+def bench_harvest(settings: dict) -> dict:
+    """get_entries against the stand-in server (no politeness delay)"""
+    results = {}
+    archive = SyntheticArchive(
+        settings["categories"], settings["records_per_set"], settings["authors_per_record"],
+    )
+    n_records = sum(len(records) for records in archive.records.values())
+    for name, unavailable in (("get_entries", 0.0), ("get_entries_503", 0.1)):
+        with StandInServer(archive, settings["page_size"], unavailable_fraction=unavailable) as server:
+            client = OAIClient(server.url, limiter=RateLimiter(0))
+            entries = []
+
+            def harvest():
+                entries[:] = get_entries(settings["categories"], cutoff_date, client=client)
+
+            seconds = timed(harvest, settings["repeat"])
+            results[name] = {
+                "seconds": seconds,
+                "records": n_records,
+                "entries": len(entries),
+                "records_per_second": n_records / seconds,
+                "requests": server.requests,
+            }
+
+    # first run of the default path, every record goes into a new store, only primary listings are kept
+    with StandInServer(archive, settings["page_size"]) as server:
+        client = OAIClient(server.url, limiter=RateLimiter(0))
+        entries = []
+
+        def harvest_into_store():
+            with tempfile.TemporaryDirectory() as directory, \
+                    RecordStore(Path(directory) / "records.sqlite") as store:
+                entries[:] = get_entries(settings["categories"], cutoff_date, cross_lists=False,
+                                         store=store, client=client)
+
+        seconds = timed(harvest_into_store, settings["repeat"])
+        results["get_entries_store"] = {
+            "seconds": seconds,
+            "records": n_records,
+            "entries": len(entries),
+            "records_per_second": n_records / seconds,
+            "requests": server.requests,
+        }
+    return results
+
+
+def bench_xml2entry(settings: dict) -> dict:
+    """Decoding of records"""
+    rng = random.Random(1)
+    n = settings["records_per_set"]
+    page = list_records_page([
+        make_record(i, "physics:astro-ph:EP", rng, settings["authors_per_record"]) for i in range(n)
+    ])
+    records = ElementTree.fromstring(page).findall("./oai:ListRecords/oai:record", namespaces=namespaces)
+
+    seconds = timed(lambda: [xml2entry(record, namespaces) for record in records], settings["repeat"])
+    streamed = timed(
+        lambda: [xml2entry(record, namespaces) for record in iter_records(io.BytesIO(page))
+                 if record.tag.endswith("record")],
+        settings["repeat"],
+    )
+    return {
+        "xml2entry": {"seconds": seconds, "records": n, "records_per_second": n / seconds},
+        "iter_records+xml2entry": {"seconds": streamed, "records": n, "records_per_second": n / streamed},
+    }
+
+
+def _entries(settings: dict, n_authors: int = None):
+    rng = random.Random(2)
+    n = settings["records_per_set"]
+    page = list_records_page([
+        make_record(i, "physics:astro-ph:EP", rng, n_authors or settings["authors_per_record"])
+        for i in range(n)
+    ])
+    return [
+        xml2entry(record, namespaces)
+        for record in ElementTree.fromstring(page).findall("./oai:ListRecords/oai:record", namespaces=namespaces)
+    ]
+
+
+def bench_evaluate(settings: dict) -> dict:
+    """Entry.evaluate scaling with number of keywords and authors"""
+    rng = random.Random(3)
+    results = {}
+    entries = _entries(settings)
+    for n_keywords in settings["keyword_counts"]:
+        keywords = keyword_ratings(n_keywords, rng)
+        authors = author_ratings(10, rng)
+        seconds = timed(lambda: evaluate_entries(entries, keywords, authors), settings["repeat"])
+        results["evaluate_keywords_{:d}".format(n_keywords)] = {
+            "seconds": seconds, "entries": len(entries), "entries_per_second": len(entries) / seconds,
+        }
+    for n_authors in settings["author_counts"]:
+        keywords = keyword_ratings(10, rng)
+        authors = author_ratings(n_authors, rng)
+        seconds = timed(lambda: evaluate_entries(entries, keywords, authors), settings["repeat"])
+        results["evaluate_authors_{:d}".format(n_authors)] = {
+            "seconds": seconds, "entries": len(entries), "entries_per_second": len(entries) / seconds,
+        }
+    large = _entries(settings, n_authors=settings["large_collaboration"])
+    keywords, authors = keyword_ratings(50, rng), author_ratings(50, rng)
+    seconds = timed(lambda: evaluate_entries(large, keywords, authors), settings["repeat"])
+    results["evaluate_collaboration_{:d}".format(settings["large_collaboration"])] = {
+        "seconds": seconds, "entries": len(large), "entries_per_second": len(large) / seconds,
+    }
+    return results
+
+
+def bench_output(settings: dict) -> dict:
+    """sort_entries and print_entries"""
+    rng = random.Random(4)
+    entries = _entries(settings)
+    evaluate_entries(entries, keyword_ratings(50, rng), author_ratings(20, rng))
+    sort_seconds = timed(lambda: sort_entries(entries, 0, False, -1), settings["repeat"])
+    top_seconds = timed(lambda: sort_entries(entries, 0, False, 20), settings["repeat"])
+
+    def print_all():
+        with redirect_stdout(io.StringIO()):
+            print_entries(entries)
+
+    print_seconds = timed(print_all, settings["repeat"])
+    return {
+        "sort_entries": {"seconds": sort_seconds, "entries": len(entries)},
+        "sort_entries_top20": {"seconds": top_seconds, "entries": len(entries)},
+        "print_entries": {"seconds": print_seconds, "entries": len(entries),
+                          "entries_per_second": len(entries) / print_seconds},
+    }
+
+
+settings_full = {
+    "categories": ["physics:astro-ph:EP", "physics:astro-ph:GA", "physics:astro-ph:SR"],
+    "records_per_set": 2000,
+    "page_size": 500,
+    "authors_per_record": 6,
+    "large_collaboration": 300,
+    "keyword_counts": [10, 100, 500],
+    "author_counts": [10, 100, 500],
+    "repeat": 3,
+}
+
+settings_quick = dict(
+    settings_full, records_per_set=200, page_size=50, large_collaboration=50,
+    keyword_counts=[10, 100], author_counts=[10, 100], repeat=1,
+)
+
+
+def compare(results: dict, baseline: dict):
+    """Print timings relative to baseline"""
+    print("{:40s} {:>10s} {:>10s} {:>8s}".format("benchmark", "baseline", "current", "ratio"))
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        old = baseline["benchmarks"][name]["seconds"]
+        new = result["seconds"]
+        print("{:40s} {:10.4f} {:10.4f} {:8.2f}".format(name, old, new, new / old))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with results from JSON file")
+    parser.add_argument("--quick", action="store_true", help="small configuration")
+    args = parser.parse_args()
+
+    settings = settings_quick if args.quick else settings_full
+    benchmarks = {}
+    for bench in (bench_harvest, bench_xml2entry, bench_evaluate, bench_output):
+        print("running", bench.__name__, file=sys.stderr)
+        benchmarks.update(bench(settings))
+
+    results = {
+        "version": arxiv_scan.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "settings": settings,
+        "benchmarks": benchmarks,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    else:
+        for name, result in benchmarks.items():
+            print("{:40s} {:10.4f}s".format(name, result["seconds"]))
+
+
+if __name__ == "__main__":
+    main()
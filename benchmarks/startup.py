@@ -0,0 +1,136 @@
+"""Start up time of the arxiv-scan command line interface
+
+Measures how long `arxiv-scan --version` takes in a fresh interpreter, the
+import time of `arxiv_scan.__main__` (from `python -X importtime`), and
+checks that none of the modules needed only for fetching, rating and
+printing entries are imported. Exits with status 1 if one of them is, or
+if start up is slower than `--max-ms`.
+
+    python benchmarks/startup.py --output startup.json
+    python benchmarks/startup.py --compare startup.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# modules that must not be loaded for --version, --edit etc.
+deferred_modules = [
+    "pytz",
+    "termcolor",
+    "xml.etree.ElementTree",
+    "http.client",
+    "sqlite3",
+    "concurrent.futures",
+    "arxiv_scan.categories",
+    "arxiv_scan.entry_evaluation",
+    "arxiv_scan.matching",
+    "arxiv_scan.oai_api",
+    "arxiv_scan.output",
+    "arxiv_scan.parse",
+    "arxiv_scan.rating",
+    "arxiv_scan.store",
+]
+
+_version_run = """
+import sys
+sys.argv = ["arxiv-scan", "--version"]
+import arxiv_scan.__main__
+try:
+    arxiv_scan.__main__.main()
+except SystemExit:
+    pass
+print("\\n".join(sorted(sys.modules)))
+"""
+
+
+def loaded_modules() -> list:
+    """Modules loaded by `arxiv-scan --version`"""
+    output = subprocess.run(
+        [sys.executable, "-c", _version_run], capture_output=True, text=True, check=True
+    ).stdout
+    return output.splitlines()[1:]
+
+
+def version_seconds(repeat: int) -> float:
+    """Best wall time of `python -m arxiv_scan --version` in a fresh interpreter"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "arxiv_scan", "--version"],
+                       capture_output=True, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def import_seconds(repeat: int) -> float:
+    """Best cumulative import time of `arxiv_scan.__main__` reported by `-X importtime`"""
+    best = float("inf")
+    for _ in range(repeat):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import arxiv_scan.__main__"],
+            capture_output=True, text=True, check=True,
+        ).stderr
+        for line in stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) == 3 and fields[2] == "arxiv_scan.__main__":
+                best = min(best, int(fields[1]) / 1e6)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with results from JSON file")
+    parser.add_argument("--repeat", type=int, default=10, help="number of runs, the best is reported")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if `arxiv-scan --version` takes longer (milliseconds)")
+    args = parser.parse_args()
+
+    loaded = set(loaded_modules())
+    imported_early = [module for module in deferred_modules if module in loaded]
+    benchmarks = {
+        "cli_version": {"seconds": version_seconds(args.repeat)},
+        "import_main": {"seconds": import_seconds(args.repeat)},
+    }
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "modules_loaded": len(loaded),
+        "deferred_modules_imported": imported_early,
+        "benchmarks": benchmarks,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("{:40s} {:>10s} {:>10s} {:>8s}".format("benchmark", "baseline", "current", "ratio"))
+        for name, result in benchmarks.items():
+            if name in baseline["benchmarks"]:
+                old = baseline["benchmarks"][name]["seconds"]
+                print("{:40s} {:10.4f} {:10.4f} {:8.2f}".format(name, old, result["seconds"], result["seconds"] / old))
+    else:
+        for name, result in benchmarks.items():
+            print("{:40s} {:10.4f}s".format(name, result["seconds"]))
+    print("{:40s} {:10d}".format("modules loaded", len(loaded)))
+
+    failed = False
+    if imported_early:
+        print("Imported at start up:", ", ".join(imported_early), file=sys.stderr)
+        failed = True
+    if args.max_ms is not None and benchmarks["cli_version"]["seconds"] * 1000 > args.max_ms:
+        print("Start up slower than {:.0f} ms".format(args.max_ms), file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
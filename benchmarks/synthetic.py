@@ -0,0 +1,136 @@
+"""Synthetic arXivRaw records and OAI-PMH responses for benchmarks"""
+import random
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from xml.sax.saxutils import escape
+
+
+vocabulary = (
+    "planet planets exoplanet star stellar disk disks protoplanetary habitable zone atmosphere "
+    "atmospheres transit transits radial velocity survey mass radius orbit orbital migration "
+    "formation evolution accretion dust gas giant terrestrial super earth neptune jupiter "
+    "spectroscopy photometry observations simulations model models population synthesis "
+    "we present find show study using data results suggest our the of and in with for on a"
+).split()
+
+surnames = (
+    "Alpher Bethe Gamow Schmidt Mueller Garcia Rossi Tanaka Kowalski Johansson Nguyen Smith "
+    "Brown Martin Dubois Ivanov Chen Wang Kumar Silva Schr\\\"{o}dinger Lopez Novak Papadopoulos"
+).split()
+
+oai_ns = "http://www.openarchives.org/OAI/2.0/"
+arxivraw_ns = "http://arxiv.org/OAI/arXivRaw/"
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(n_words))
+
+def _author(rng: random.Random) -> str:
+    return "{:s}. {:s}".format(chr(rng.randrange(ord("A"), ord("Z") + 1)), rng.choice(surnames))
+
+def _date(date: datetime) -> str:
+    return date.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+
+def make_record(number: int, set_spec: str, rng: random.Random, n_authors: int = 5,
+                cross_list: bool = False, date: datetime = None) -> str:
+    """XML of a single arXivRaw record
+
+    Args:
+        number (int): running number, used for the arXiv id
+        set_spec (str): OAI set of the record
+        rng (random.Random): source of randomness
+        n_authors (int): number of authors
+        cross_list (bool): list record with another primary category
+        date (datetime): submission date (default: 2024-05-02 UTC)
+    """
+    if date is None:
+        date = datetime(2024, 5, 2, tzinfo=timezone.utc)
+    identifier = "2405.{:05d}".format(number)
+    primary = "physics:cond-mat" if cross_list else set_spec
+    versions = "".join(
+        '<version version="v{:d}"><date>{:s}</date><size>100kb</size></version>'.format(
+            v + 1, _date(date + timedelta(days=v, seconds=number))
+        )
+        for v in range(rng.randint(1, 3))
+    )
+    authors = ", ".join(_author(rng) for _ in range(n_authors))
+    return (
+        "<record><header><identifier>oai:arXiv.org:{id:s}</identifier>"
+        "<datestamp>{datestamp:s}</datestamp><setSpec>{primary:s}</setSpec></header>"
+        '<metadata><arXivRaw xmlns="{ns:s}"><id>{id:s}</id>{versions:s}'
+        "<title>{title:s}</title><authors>{authors:s}</authors>"
+        "<categories>astro-ph.EP</categories><abstract>  {abstract:s}\n</abstract>"
+        "</arXivRaw></metadata></record>"
+    ).format(
+        id=identifier,
+        datestamp=date.strftime("%Y-%m-%d"),
+        primary=primary,
+        ns=arxivraw_ns,
+        versions=versions,
+        title=escape(_sentence(rng, rng.randint(6, 15)).capitalize()).replace(" ", "\n  ", 1),
+        authors=escape(authors),
+        abstract=escape(_sentence(rng, rng.randint(120, 250))),
+    )
+
+
+def list_records_page(records: list, token: str = None, cursor: int = 0, total: int = None) -> bytes:
+    """ListRecords response with given record XML strings and resumption token"""
+    if token is not None:
+        resumption = '<resumptionToken cursor="{:d}" completeListSize="{:d}">{:s}</resumptionToken>'.format(
+            cursor, total or 0, urllib.parse.quote(token)
+        )
+    else:
+        resumption = ""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<OAI-PMH xmlns="{:s}"><responseDate>2024-05-06T00:00:00Z</responseDate>'
+        "<ListRecords>{:s}{:s}</ListRecords></OAI-PMH>"
+    ).format(oai_ns, "".join(records), resumption).encode()
+
+
+def list_sets_page(set_specs: list) -> bytes:
+    """ListSets response with given sets"""
+    sets = "".join(
+        "<set><setSpec>{0:s}</setSpec><setName>{0:s}</setName></set>".format(spec) for spec in set_specs
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<OAI-PMH xmlns="{:s}"><ListSets>{:s}</ListSets></OAI-PMH>'
+    ).format(oai_ns, sets).encode()
+
+
+class SyntheticArchive:
+    """Deterministic set of synthetic records per OAI set
+
+    Args:
+        set_specs (list): OAI sets of the archive
+        records_per_set (int): number of records in every set
+        n_authors (int): number of authors per record
+        cross_list_fraction (float): fraction of records that are cross-lists
+        shared_fraction (float): fraction of records listed in every set
+        seed (int): random seed
+    """
+
+    def __init__(self, set_specs: list, records_per_set: int = 1000, n_authors: int = 5,
+                 cross_list_fraction: float = 0.2, shared_fraction: float = 0.1, seed: int = 0):
+        self.set_specs = list(set_specs)
+        self.records = {}
+        rng = random.Random(seed)
+        n_shared = int(records_per_set * shared_fraction)
+        shared = [
+            make_record(number, self.set_specs[0], rng, n_authors, rng.random() < cross_list_fraction)
+            for number in range(n_shared)
+        ]
+        number = n_shared
+        for set_spec in self.set_specs:
+            own = []
+            for _ in range(records_per_set - n_shared):
+                own.append(make_record(number, set_spec, rng, n_authors, rng.random() < cross_list_fraction))
+                number += 1
+            self.records[set_spec] = shared + own
+
+    def pages(self, set_spec: str, page_size: int):
+        """Split records of set into pages of page_size records"""
+        records = self.records[set_spec]
+        return [records[i:i + page_size] for i in range(0, len(records), page_size)] or [[]]
@@ -0,0 +1,76 @@
+import json
+import urllib.error
+
+import pytest
+
+from arxiv_scan.categories import load_categories
+from arxiv_scan.oai_api import Response
+
+list_sets = (
+    '<?xml version="1.0" encoding="UTF-8"?><OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/"><ListSets>'
+    "<set><setSpec>physics:astro-ph</setSpec></set><set><setSpec>cs</setSpec></set>"
+    "</ListSets></OAI-PMH>"
+).encode()
+
+
+class StubClient:
+    """Answers every request with the next of the given statuses"""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.requests = []
+
+    def get(self, query, headers=None, timeout=None, attempts=None):
+        self.requests.append(headers)
+        status = self.statuses.pop(0)
+        if status >= 400:
+            raise urllib.error.HTTPError("https://export.arxiv.org/oai2", status, None, {}, None)
+        data = list_sets if status == 200 else b""
+        return Response("https://export.arxiv.org/oai2", status, {"ETag": '"v1"'}, data, len(data), 0.0)
+
+
+def test_download_and_cache(tmp_path):
+    cache_path = tmp_path / "categories.json"
+    client = StubClient(200)
+    assert load_categories(cache_path, client=client) == ["cs", "physics:astro-ph"]
+    assert client.requests == [None]
+    cached = json.loads(cache_path.read_text())
+    assert cached["categories"] == ["cs", "physics:astro-ph"]
+    assert cached["etag"] == '"v1"'
+
+    # within the ttl the cache is used without a request
+    assert load_categories(cache_path, client=client) == ["cs", "physics:astro-ph"]
+    assert len(client.requests) == 1
+    assert list(tmp_path.iterdir()) == [cache_path]
+
+
+def test_revalidate_not_modified(tmp_path):
+    cache_path = tmp_path / "categories.json"
+    load_categories(cache_path, client=StubClient(200))
+    fetched = json.loads(cache_path.read_text())["fetched"]
+
+    client = StubClient(304)
+    assert load_categories(cache_path, ttl=0, client=client) == ["cs", "physics:astro-ph"]
+    assert client.requests == [{"If-None-Match": '"v1"'}]
+    cached = json.loads(cache_path.read_text())
+    assert cached["categories"] == ["cs", "physics:astro-ph"]
+    assert cached["fetched"] >= fetched
+
+
+@pytest.mark.parametrize("status", [503, 500])
+def test_revalidate_error_uses_cache(tmp_path, status):
+    cache_path = tmp_path / "categories.json"
+    load_categories(cache_path, client=StubClient(200))
+    content = cache_path.read_text()
+
+    client = StubClient(status)
+    assert load_categories(cache_path, ttl=0, client=client) == ["cs", "physics:astro-ph"]
+    assert len(client.requests) == 1
+    assert cache_path.read_text() == content
+
+
+def test_error_without_cache(tmp_path):
+    cache_path = tmp_path / "categories.json"
+    with pytest.raises(urllib.error.HTTPError):
+        load_categories(cache_path, client=StubClient(503))
+    assert not cache_path.exists()
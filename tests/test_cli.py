@@ -0,0 +1,31 @@
+import re
+import sys
+from datetime import datetime, timezone
+
+from arxiv_scan.__main__ import main, parse_cli_arguments
+from arxiv_scan.entry_evaluation import Entry
+from arxiv_scan.store import RecordStore
+
+
+def test_search_arguments_with_negated_terms():
+    args = parse_cli_arguments(["--log", "info", "search", "hot", "-cat:astro-ph", "-n", "5", "-hot"])
+    assert args.query == ["hot", "NOT", "cat:astro-ph", "NOT", "hot"]
+    assert args.number == 5
+
+
+def test_search_negated_category(tmp_path, monkeypatch, capsys):
+    date = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    (tmp_path / "arxiv-scan").mkdir()
+    with RecordStore(tmp_path / "arxiv-scan" / "records.sqlite") as store:
+        for set_spec, id in [("physics:astro-ph:EP", "2405.00001"), ("physics:astro-ph:GA", "2405.00002")]:
+            entry = Entry(id=id, title=f"Hot planets {id}", authors=["R. Alpher"], abstract="A hot topic",
+                          category=set_spec, date_submitted=date, date_updated=date)
+            store.add([(entry, "2024-05-01")], set_spec)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(sys, "argv", ["arxiv-scan", "search", "hot", "-cat:astro-ph:ga"])
+    main()
+    output = capsys.readouterr().out
+    assert "2405.00001" in output
+    assert "2405.00002" not in output
+    # BM25 scores are shown with one decimal
+    assert re.search(r"\(\d+\.\d\) https://arxiv.org/abs/2405.00001", output)
@@ -0,0 +1,51 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+
+from arxiv_scan.docfreq import DocumentFrequencies, tfidf
+from arxiv_scan.entry_evaluation import Entry
+from arxiv_scan.store import RecordStore, StoreIndex
+from arxiv_scan.wordcounter import words
+
+date = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def entry(number: int, abstract: str) -> Entry:
+    return Entry(id=f"2405.{number:05d}", title="Planets", authors=["R. Alpher"], abstract=abstract,
+                 category="physics:astro-ph:EP", date_submitted=date, date_updated=date)
+
+
+def test_incremental_update_matches_recount(tmp_path):
+    categories = ["physics:astro-ph:EP", "physics:astro-ph:GA"]
+    with RecordStore(tmp_path / "records.sqlite") as store, \
+            DocumentFrequencies(tmp_path / "docfreq.sqlite") as frequencies:
+        store.add([(entry(i, "transit spectra of planets"), "2024-05-01") for i in range(10)], categories[0])
+        assert frequencies.update(store) == 10
+        # new versions (replacing the old words), cross-lists and new records
+        store.add([(entry(i, "galaxy mergers and dust"), "2024-05-02") for i in range(5, 15)], categories[1])
+        store.add([(entry(i, "habitable zone"), "2024-05-02") for i in range(3)], categories[0])
+        assert frequencies.update(store) == 13
+        assert frequencies.update(store) == 0
+
+        expected = Counter()
+        documents = 0
+        for _, stored, set_specs in store.changed_since(0):
+            for _ in set_specs:
+                documents += 1
+                expected.update(set(words(f"{stored.title} {stored.abstract}")))
+        assert frequencies.frequencies(categories) == dict(expected)
+        assert frequencies.documents(categories) == documents == 20
+        assert "transit" not in frequencies.frequencies([categories[1]])
+
+
+def test_tfidf():
+    scores = tfidf(Counter(planets=4, transit=2, unknown=9), {"planets": 10, "transit": 2}, 10)
+    assert scores["planets"] == 0
+    assert scores["transit"] > 0
+    assert scores["unknown"] == 0
+
+
+def test_store_index_requires_add(tmp_path):
+    with pytest.raises(TypeError):
+        StoreIndex(tmp_path / "index.sqlite")
@@ -0,0 +1,136 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from arxiv_scan.entry_evaluation import Entry, EntryBatch, EntryRanker, evaluate_entries, sort_entries
+from arxiv_scan.rating import RatingProfile
+
+date = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def entry(title: str, abstract: str, authors: list = (), number: int = 1) -> Entry:
+    return Entry(id=f"2405.{number:05d}", title=title, authors=list(authors), abstract=abstract,
+                 category="physics:astro-ph:EP", date_submitted=date, date_updated=date)
+
+
+# keyword ratings, author ratings, rate_abstract, (title, abstract, authors),
+# expected rating, detailed_ratings, title_spans and author_marks
+cases = [
+    pytest.param(
+        {"planet": 1, "planets": 2, "net": 1}, {}, True, ("Planets and planetary nets", "planet planet", []),
+        11, {"planet": 4, "planets": 2, "net": 5}, [(0, 7), (12, 18), (22, 25)], [],
+        id="overlapping keywords",
+    ),
+    pytest.param(
+        {"aa": 1}, {}, True, ("aaa aaaa", "aaaaa", []),
+        5, {"aa": 5}, [(0, 2), (4, 8)], [],
+        id="overlapping occurrences counted once",
+    ),
+    pytest.param(
+        {"Habitable Zone": 2, "HOT": 1}, {}, True, ("The HABITABLE zone of hot stars", "Habitable zones are hot.", []),
+        6, {"habitable zone": 4, "hot": 2}, [(4, 18), (22, 25)], [],
+        id="case",
+    ),
+    pytest.param(
+        {"c++": 1, "a.b": 2}, {}, True, ("a.b code in c++ (not axb)", "c++", []),
+        4, {"c++": 2, "a.b": 2}, [(0, 3), (12, 15)], [],
+        id="regex characters are literal",
+    ),
+    pytest.param(
+        {"transit": 1}, {}, False, ("Transit timing", "transits transit", []),
+        1, {"transit": 1}, [(0, 7)], [],
+        id="title only",
+    ),
+    pytest.param(
+        {"dust": 1}, {"Alpher": 3, "Bethe": 2, "Einstein": 5}, True, ("Dust", "", ["H. Bethe", "R. Alpher", "G. Gamow"]),
+        6, {"dust": 1, "Alpher": 3, "Bethe": 2}, [(0, 4)], [1, 1, 0],
+        id="authors",
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "keywords, authors, rate_abstract, texts, rating, detailed_ratings, title_spans, author_marks", cases
+)
+def test_evaluate(keywords, authors, rate_abstract, texts, rating, detailed_ratings, title_spans, author_marks):
+    evaluated = entry(*texts)
+    assert evaluated.evaluate(keywords, authors, rate_abstract) == rating
+    assert evaluated.detailed_ratings == detailed_ratings
+    assert evaluated.title_spans == title_spans
+    assert list(evaluated.author_marks) == author_marks
+
+    # compiled once, as for many entries
+    compiled = entry(*texts)
+    assert RatingProfile(keywords, authors, rate_abstract).evaluate(compiled) == rating
+    assert (compiled.detailed_ratings, compiled.title_spans, compiled.author_marks) == (
+        evaluated.detailed_ratings, evaluated.title_spans, evaluated.author_marks
+    )
+
+
+def sample_entries(n: int) -> list:
+    words = "planet transit dust habitable zone star disk the of and".split()
+    names = ["R. Alpher", "H. Bethe", "G. Gamow", "A. Einstein"]
+    return [
+        entry(" ".join(words[(i * 7 + k) % len(words)] for k in range(i % 5 + 2)),
+              " ".join(words[(i * 3 + k) % len(words)] for k in range(i % 11 + 5)),
+              names[i % 4:i % 4 + 2], i)
+        for i in range(n)
+    ]
+
+
+def test_parallel_evaluation_matches_serial():
+    keywords = {"planet": 2, "transit": 1, "habitable zone": 3, "dust": -1}
+    authors = {"Alpher": 2, "Gamow": 1}
+    serial = sample_entries(50)
+    parallel = sample_entries(50)
+    evaluate_entries(serial, keywords, authors, workers=1)
+    evaluate_entries(parallel, keywords, authors, workers=2)
+    assert [(e.id, e.title, e.rating, e.detailed_ratings, e.title_spans, e.author_marks) for e in parallel] == \
+        [(e.id, e.title, e.rating, e.detailed_ratings, e.title_spans, e.author_marks) for e in serial]
+
+
+def sorted_reference(entries: list, rating_min: int, reverse: bool, length: int) -> list:
+    """Filter and stable sort of all entries, as `sort_entries` used to do"""
+    results = sorted((entry for entry in entries if entry.rating >= rating_min),
+                     key=lambda entry: entry.rating, reverse=not reverse)
+    return results[:length if length >= 0 else None]
+
+
+@pytest.mark.parametrize("rating_min", [-100, 0, 3])
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize("length", [-1, 0, 1, 7, 100])
+def test_ranking_matches_sorting(rating_min, reverse, length):
+    entries = sample_entries(60)
+    evaluate_entries(entries, {"planet": 2, "transit": 1, "dust": -1}, {"Alpher": 2})
+    expected = [entry.id for entry in sorted_reference(entries, rating_min, reverse, length)]
+    assert [entry.id for entry in sort_entries(entries, rating_min, reverse, length)] == expected
+
+    ranker = EntryRanker(rating_min, reverse, length)
+    assert [ranker.add(entry) for entry in entries] == [entry.rating >= rating_min for entry in entries]
+    assert [entry.id for entry in ranker.results()] == expected
+
+
+def fields(entry: Entry) -> tuple:
+    return (entry.id, entry.title, entry.authors, entry.abstract, entry.category, entry.matched_categories,
+            entry.date_submitted, entry.date_updated, entry.rating, entry.detailed_ratings,
+            entry.title_spans, list(entry.author_marks))
+
+
+def test_batch_round_trip():
+    entries = sample_entries(20)
+    for i, sample in enumerate(entries):
+        sample.matched_categories = ["physics:astro-ph:EP", "physics:astro-ph:GA"][:i % 3]
+        sample.date_updated = datetime(2024, 5, 2, 13, 14, 15, 123456, tzinfo=timezone.utc)
+    # matches rating zero in total are kept as well
+    evaluate_entries(entries[:15], {"planet": 1, "transit": -1}, {"Alpher": 1})
+    assert any(sample.rating == 0 and sample.detailed_ratings for sample in entries[:15])
+
+    batch = EntryBatch(entries)
+    assert len(batch) == len(entries)
+    assert [fields(sample) for sample in batch] == [fields(sample) for sample in entries]
+    assert fields(batch[-1]) == fields(entries[-1])
+
+    # evaluating the batch in place gives the same results as the entries
+    evaluate_entries(entries, {"habitable zone": 3}, {"Gamow": 2})
+    evaluate_entries(batch, {"habitable zone": 3}, {"Gamow": 2})
+    assert [fields(sample) for sample in batch] == [fields(sample) for sample in entries]
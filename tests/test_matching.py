@@ -0,0 +1,20 @@
+from arxiv_scan.matching import AuthorMatcher
+
+
+def test_author_initial_matches_with_middle_names():
+    matcher = AuthorMatcher({"R. Alpher": 1})
+    for author in ["R. Alpher", "Ralph Alpher", "R. A. Alpher", "Ralph A. Alpher", "Ralph Asher Alpher"]:
+        assert matcher.match([author]) == {0: 0}, author
+
+
+def test_author_names_must_match_in_order():
+    matcher = AuthorMatcher({"R. Alpher": 1, "Ralph A. Alpher": 2})
+    assert matcher.match(["H. Alpher"]) == {}
+    assert matcher.match(["Ralph Alpher"]) == {0: 0}
+    assert matcher.match(["A. Ralph Alpher"]) == {0: 0}
+
+
+def test_surname_matches_any_author_with_that_surname():
+    matcher = AuthorMatcher({"Alpher": 1})
+    assert matcher.match(["H. Bethe", "Ralph A. Alpher"]) == {0: 1}
+    assert matcher.match(["G. Gamow"]) == {}
@@ -0,0 +1,88 @@
+import http.client
+import urllib.error
+
+import pytest
+
+from arxiv_scan import oai_api
+from arxiv_scan.oai_api import OAIClient, Response
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.pauses = []
+
+    def wait(self):
+        pass
+
+    def pause(self, seconds):
+        self.pauses.append(seconds)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(oai_api.time, "sleep", sleeps.append)
+    monkeypatch.setattr(oai_api, "backoff_base", 2)
+    return sleeps
+
+
+def client_answering(*responses) -> OAIClient:
+    """Client getting `(status, headers)` responses instead of sending requests"""
+    client = OAIClient("https://export.arxiv.org/oai2", limiter=RecordingLimiter())
+    responses = list(responses)
+    client.queries = []
+
+    def request(query, headers, timeout):
+        client.queries.append(query)
+        status, response_headers = responses.pop(0)
+        message = http.client.HTTPMessage()
+        for key, value in response_headers.items():
+            message[key] = value
+        return Response(f"{client.base_url}?{query}", status, message, b"<OAI-PMH/>", 10, 0.0)
+
+    client._request = request
+    return client
+
+
+def test_retry_server_errors_with_backoff(sleeps):
+    client = client_answering((500, {}), (502, {}), (200, {}))
+    assert client.get("verb=ListSets").status == 200
+    assert len(client.queries) == 3
+    # jittered exponential backoff: backoff_base * 2**attempt, halved at most
+    assert len(sleeps) == 2
+    assert 1 <= sleeps[0] <= 2
+    assert 2 <= sleeps[1] <= 4
+
+
+def test_give_up_after_attempts(sleeps):
+    client = client_answering(*[(500, {})] * 3)
+    with pytest.raises(urllib.error.HTTPError) as err:
+        client.get("verb=ListSets", attempts=3)
+    assert err.value.code == 500
+    assert len(client.queries) == 3
+    assert len(sleeps) == 2
+
+
+def test_retry_after_pauses_all_requests(sleeps):
+    client = client_answering((503, {"Retry-After": "7"}), (200, {}))
+    assert client.get("verb=ListSets").status == 200
+    assert len(client.queries) == 2
+    assert client.limiter.pauses == [7]
+    # the limiter holds back the next request, no backoff on top
+    assert sleeps == []
+
+
+@pytest.mark.parametrize("status", [400, 404])
+def test_client_errors_are_not_retried(sleeps, status):
+    client = client_answering((status, {}), (200, {}))
+    with pytest.raises(urllib.error.HTTPError) as err:
+        client.get("verb=ListSets")
+    assert err.value.code == status
+    assert len(client.queries) == 1
+    assert sleeps == []
+
+
+def test_not_modified_is_returned(sleeps):
+    client = client_answering((304, {}))
+    assert client.get("verb=ListSets", headers={"If-None-Match": '"v1"'}).status == 304
+    assert len(client.queries) == 1
@@ -0,0 +1,83 @@
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from arxiv_scan.parse import get_entries, iter_entries
+from arxiv_scan.store import RecordStore
+
+category = "physics:astro-ph:EP"
+
+
+def record(number: int, datestamp: str, primary: str = category) -> str:
+    date = datetime.strptime(datestamp, "%Y-%m-%d").strftime("%a, %d %b %Y 12:00:00 GMT")
+    return (
+        f"<record><header><identifier>oai:arXiv.org:2405.{number:05d}</identifier>"
+        f"<datestamp>{datestamp:s}</datestamp><setSpec>{primary:s}</setSpec></header>"
+        '<metadata><arXivRaw xmlns="http://arxiv.org/OAI/arXivRaw/">'
+        f'<id>2405.{number:05d}</id><version version="v1"><date>{date:s}</date></version>'
+        f"<title>Planets {number:d}</title><authors>R. Alpher, H. Bethe</authors>"
+        "<abstract>Transit spectra</abstract></arXivRaw></metadata></record>"
+    )
+
+
+class FakeClient:
+    """Answers ListRecords with all records since `from`, in a single page"""
+
+    def __init__(self, records: list):
+        self.records = records
+        self.queries = []
+
+    def get(self, query: str, *args, **kwargs):
+        self.queries.append(query)
+        date_from = urllib.parse.parse_qs(query)["from"][0]
+        records = "".join(xml for datestamp, xml in self.records if datestamp >= date_from)
+        return SimpleNamespace(data=(
+            '<?xml version="1.0" encoding="UTF-8"?><OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+            f"<ListRecords>{records:s}</ListRecords></OAI-PMH>"
+        ).encode())
+
+
+def harvest(cutoff: str, store: RecordStore, client: FakeClient) -> list:
+    cutoff_date = datetime.strptime(cutoff, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return sorted(entry.id for entry in get_entries([category], cutoff_date, store=store, client=client))
+
+
+def test_incremental_harvest(tmp_path):
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    dates = ["2024-04-10", "2024-04-20", "2024-05-02", "2024-05-03"]
+    client = FakeClient([(date, record(i, date)) for i, date in enumerate(dates)])
+    client.records.append(("2024-05-04", record(4, "2024-05-04", primary="physics:cond-mat")))
+
+    with RecordStore(tmp_path / "records.sqlite") as store:
+        assert harvest("2024-05-01", store, client) == ["2405.00002", "2405.00003", "2405.00004"]
+        assert store.coverage(category) == ("2024-05-01", today)
+
+        # earlier cutoff: the window is harvested again and the coverage extended
+        assert harvest("2024-04-15", store, client) == ["2405.00001", "2405.00002", "2405.00003", "2405.00004"]
+        assert store.coverage(category) == ("2024-04-15", today)
+        assert len(client.queries) == 2
+
+        # within the window only records since the watermark are requested, the rest is stored
+        client.records.append((today, record(5, today)))
+        assert harvest("2024-04-15", store, client) == [
+            "2405.00001", "2405.00002", "2405.00003", "2405.00004", "2405.00005"
+        ]
+        assert len(client.queries) == 3
+        assert urllib.parse.parse_qs(client.queries[-1])["from"] == [today]
+        assert store.coverage(category) == ("2024-04-15", today)
+
+        # cross-lists are kept in the store, but filtered when they are not wanted
+        cutoff_date = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        entries = get_entries([category], cutoff_date, cross_lists=False, store=store, client=client)
+        assert sorted(entry.id for entry in entries) == ["2405.00002", "2405.00003", "2405.00005"]
+
+
+def test_stopped_iteration_cancels_pending_categories():
+    client = FakeClient([("2024-05-02", record(i, "2024-05-02", primary=f"physics:set{i:d}")) for i in range(3)])
+    categories = [f"physics:set{i:d}" for i in range(3)]
+    entries = iter_entries(categories, datetime(2024, 5, 1, tzinfo=timezone.utc), workers=1, client=client)
+    next(entries)
+    entries.close()
+    time.sleep(0.5)
+    assert len(client.queries) == 1
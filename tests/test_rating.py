@@ -0,0 +1,70 @@
+import logging
+import os
+
+from arxiv_scan import rating
+from arxiv_scan.config import Config
+from arxiv_scan.rating import load_profile
+
+config_text = """[keywords]
+planet = 2
+habitable zone = 3
+[authors]
+Alpher = 5
+"""
+
+
+def read_config(path) -> Config:
+    config = Config()
+    config.read(path)
+    return config
+
+
+def compiled(caplog) -> int:
+    n = sum(record.getMessage().startswith("Compiling rating profile") for record in caplog.records)
+    caplog.clear()
+    return n
+
+
+def test_profile_cache(tmp_path, monkeypatch, caplog):
+    caplog.set_level(logging.DEBUG, logger="arxiv_scan.rating")
+    monkeypatch.setattr(rating, "_loaded", {})
+    path = tmp_path / "arxiv-scan.conf"
+    path.write_text(config_text)
+    cache_dir = tmp_path / "profiles"
+
+    profile = load_profile(read_config(path), cache_dir)
+    assert compiled(caplog) == 1
+    assert profile.keywords == (("planet", 2), ("habitable zone", 3))
+    # unchanged file: from memory, and from disk in a new process
+    assert load_profile(read_config(path), cache_dir) is profile
+    monkeypatch.setattr(rating, "_loaded", {})
+    assert load_profile(read_config(path), cache_dir).digest == profile.digest
+    assert compiled(caplog) == 0
+
+    # touched but unchanged: the content hash decides
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_profile(read_config(path), cache_dir).digest == profile.digest
+    assert "touched but unchanged" in caplog.text
+    assert compiled(caplog) == 0
+
+    # edited: compiled again
+    path.write_text(config_text.replace("planet = 2", "planet = 4"))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    edited = load_profile(read_config(path), cache_dir)
+    assert compiled(caplog) == 1
+    assert edited.keywords == (("planet", 4), ("habitable zone", 3))
+    assert load_profile(read_config(path), cache_dir) is edited
+    assert compiled(caplog) == 0
+
+
+def test_changed_config_is_not_cached(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(rating, "_loaded", {})
+    path = tmp_path / "arxiv-scan.conf"
+    path.write_text(config_text)
+    config = read_config(path)
+    config.add_keyword("dust", 1)
+    assert config.path is None
+    profile = load_profile(config, tmp_path / "profiles")
+    assert ("dust", 1) in profile.keywords
+    assert not (tmp_path / "profiles").exists()
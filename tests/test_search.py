@@ -0,0 +1,16 @@
+import pytest
+
+from arxiv_scan.search import AUTHOR, CATEGORY, TEXT, parse_query
+
+
+def test_negated_terms():
+    assert parse_query("hot -cat:astro-ph") == parse_query("hot NOT cat:astro-ph") == (
+        "and", [("phrase", TEXT, ["hot"]), ("not", ("phrase", CATEGORY, ["astro-ph"]))]
+    )
+    assert parse_query("author:alpher") == ("phrase", AUTHOR, ["alpher"])
+
+
+@pytest.mark.parametrize("query", ["foo AND", "AND foo", "foo AND OR bar", "foo OR", "foo NOT", "(foo AND)"])
+def test_dangling_operator(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
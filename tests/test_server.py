@@ -0,0 +1,25 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from arxiv_scan.server import next_refresh
+
+eastern = ZoneInfo("America/New_York")
+
+
+@pytest.mark.parametrize("now, expected", [
+    # Tuesday before, inside and after the 20:00-20:30 window
+    (datetime(2026, 10, 13, 19, 59, tzinfo=eastern), datetime(2026, 10, 13, 20, 30, tzinfo=eastern)),
+    (datetime(2026, 10, 13, 20, 10, tzinfo=eastern), datetime(2026, 10, 13, 20, 30, tzinfo=eastern)),
+    (datetime(2026, 10, 13, 20, 30, tzinfo=eastern), datetime(2026, 10, 14, 20, 30, tzinfo=eastern)),
+    (datetime(2026, 10, 13, 23, 0, tzinfo=eastern), datetime(2026, 10, 14, 20, 30, tzinfo=eastern)),
+    # reported case: Tuesday 20:10 ET in UTC
+    (datetime(2026, 10, 14, 0, 10, tzinfo=timezone.utc), datetime(2026, 10, 13, 20, 30, tzinfo=eastern)),
+    # no announcements on Friday and Saturday evening
+    (datetime(2026, 10, 16, 20, 10, tzinfo=eastern), datetime(2026, 10, 18, 20, 30, tzinfo=eastern)),
+    (datetime(2026, 10, 15, 20, 45, tzinfo=eastern), datetime(2026, 10, 18, 20, 30, tzinfo=eastern)),
+    (datetime(2026, 10, 18, 20, 10, tzinfo=eastern), datetime(2026, 10, 18, 20, 30, tzinfo=eastern)),
+])
+def test_next_refresh(now, expected):
+    assert next_refresh(now) == expected
@@ -0,0 +1,42 @@
+from collections import Counter
+
+import pytest
+
+from arxiv_scan import wordcounter
+from arxiv_scan.wordcounter import count_words, words
+
+lines = [
+    r"We study the habitable zone of planets around Schrödinger stars \cite{alpher1948,bethe1939}.",
+    r"\begin{equation} \label{eq:transit} depth = radius^2 \end{equation}",
+    "Transit spectroscopy of exoplanet atmospheres",
+    # longer than a chunk, split at a space
+    "planetary migration in protoplanetary disks " * 4,
+    "",
+]
+
+
+@pytest.fixture
+def text_file(tmp_path, monkeypatch):
+    # small chunks and parts, so words and lines cross their boundaries
+    monkeypatch.setattr(wordcounter, "chunk_size", 51)
+    monkeypatch.setattr(wordcounter, "part_size", 300)
+    text = "\n".join(lines[i % len(lines)] for i in range(200)) + "\nfinal"
+    path = tmp_path / "paper.tex"
+    path.write_text(text, encoding="utf-8")
+    return path, text
+
+
+def test_chunk_boundaries(text_file):
+    path, text = text_file
+    assert len(wordcounter._split(path)) > 10
+    # the first chunk ends within a word, and within the UTF-8 bytes of a character
+    assert text.encode()[:wordcounter.chunk_size].endswith("Schrö".encode()[:-1])
+    expected = Counter(words(text))
+    for word in wordcounter.stop_words | wordcounter.bibtex_fields:
+        expected.pop(word, None)
+    assert count_words([path]) == expected
+
+
+def test_parallel_counts_match_serial(text_file):
+    path, _ = text_file
+    assert count_words([path], workers=2) == count_words([path], workers=1)